@@ -0,0 +1,133 @@
+"""Benchmark of the blockchain importer against recorded address details.
+
+Generates synthetic wallets with the given number of txrefs in total, spread
+over a few addresses, as address details recorded from BlockCypher. Times the
+extraction replaying them from files and from a local HTTP server, without a
+cache and with a warm txref cache.
+
+    python benchmarks/blockchain_importer.py [txrefs...]
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+
+from beancount.core import amount, data
+from beancount.core.number import D
+
+from tariochbctools.importers.blockchain import importer as bcimp
+
+ADDRESSES = 4
+TIP = 800_000
+
+
+class Handler(SimpleHTTPRequestHandler):
+    # send the headers and body in one segment, otherwise Nagle's algorithm
+    # and delayed acks stall every response on a kept alive connection
+    disable_nagle_algorithm = True
+    wbufsize = -1
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+
+def createWallets(directory, count):
+    os.mkdir(path.join(directory, "recorded"))
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    addresses = []
+    for a in range(ADDRESSES):
+        address = f"ADDRESS{a}"
+        txrefs = [
+            {
+                "tx_hash": f"{a:02}{i:062x}",
+                "block_height": TIP - i * 3,
+                "tx_input_n": -1,
+                "tx_output_n": 0,
+                "value": 10_000 + i,
+                "confirmations": i * 3 + 1,
+                "confirmed": (start + timedelta(minutes=(count - i) * 10)).isoformat(),
+            }
+            for i in range(count // ADDRESSES)
+        ]
+        with open(path.join(directory, "recorded", f"btc-{address}.json"), "w") as f:
+            json.dump({"address": address, "txrefs": txrefs}, f)
+        addresses.append(
+            {
+                "address": address,
+                "currency": "BTC",
+                "narration": "Synthetic",
+                "asset_account": "Assets:Crypto:BTC",
+            }
+        )
+    return addresses
+
+
+def createPrices(count):
+    return [
+        data.Price(
+            data.new_metadata("prices", 0),
+            date(2020, 1, 1) + timedelta(days=day),
+            "BTC",
+            amount.Amount(D("40000"), "CHF"),
+        )
+        for day in range(count // 100 + 2)
+    ]
+
+
+def writeConfig(directory, addresses, replay, cache):
+    config = {"base_ccy": "CHF", "addresses": addresses, "replay": replay}
+    if cache:
+        config["cache_dir"] = "cache"
+    configPath = path.join(directory, "blockchain.yaml")
+    with open(configPath, "w") as f:
+        json.dump(config, f)
+    return configPath
+
+
+def run(configPath, existing):
+    start = time.perf_counter()
+    entries = bcimp.Importer().extract(configPath, existing)
+    return time.perf_counter() - start, len(entries)
+
+
+def main(sizes):
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            addresses = createWallets(directory, size)
+            existing = createPrices(size)
+
+            server = ThreadingHTTPServer(
+                ("localhost", 0),
+                partial(Handler, directory=path.join(directory, "recorded")),
+            )
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = f"http://localhost:{server.server_address[1]}"
+            try:
+                results = []
+                for name, replay in [("files", "recorded"), ("http", url)]:
+                    config = writeConfig(directory, addresses, replay, False)
+                    results.append((name, "no cache", *run(config, existing)))
+                    config = writeConfig(directory, addresses, replay, True)
+                    run(config, existing)
+                    results.append((name, "warm cache", *run(config, existing)))
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        for name, cache, seconds, entries in results:
+            print(  # noqa: T201
+                f"{size:>7} txrefs, {name:>5}, {cache:>10}: {seconds:.2f}s "
+                f"({entries / seconds:,.0f} txrefs/s)"
+            )
+
+
+if __name__ == "__main__":
+    main([int(s) for s in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,151 @@
+"""Benchmark of the check_portfolio_sum plugin.
+
+Times the plugin against the plugin as it was before the check on whole
+cents, on balanced transactions spread over a few portfolios, which is what
+nearly all transactions of a ledger look like. Then times the fast path on
+whole cents against the Decimal fallback per transaction, and the whole plugin
+checking serially against checking on forked workers, one per CPU (at least 2).
+
+    python benchmarks/check_portfolio_sum.py [transactions]
+"""
+
+import os
+import sys
+import timeit
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from math import isclose
+
+from beancount.core import amount, convert, data
+from beancount.core.number import D
+
+from tariochbctools.plugins import check_portfolio_sum
+
+PORTFOLIOS = ["Peter", "Anna", "Common"]
+
+
+def createTransactions(count):
+    meta = data.new_metadata("benchmark", 0)
+    transactions = []
+    for i in range(count):
+        number = D(f"{i % 1000}.{i % 100:02}")
+        postings = []
+        for portfolio in PORTFOLIOS[: 1 + i % len(PORTFOLIOS)]:
+            for account, sign in [
+                (f"Assets:{portfolio}:Bank", -1),
+                (f"Expenses:{portfolio}:Food", 1),
+            ]:
+                postings.append(
+                    data.Posting(
+                        account,
+                        amount.Amount(sign * number, "CHF"),
+                        None,
+                        None,
+                        None,
+                        None,
+                    )
+                )
+        transactions.append(
+            data.Transaction(
+                meta,
+                date(2020, 1, 1),
+                "*",
+                None,
+                "",
+                frozenset(),
+                frozenset(),
+                postings,
+            )
+        )
+
+    return transactions
+
+
+def originalCheck(entries, options_map):
+    """The plugin as it was before the check on whole cents."""
+    errors = []
+
+    for entry in data.filter_txns(entries):
+        positivePortfolioSums = defaultdict(Decimal)
+        negativePortfolioSums = defaultdict(Decimal)
+        for posting in entry.postings:
+            if posting.meta and "portfolio_check_weight" in posting.meta:
+                weight = Decimal(posting.meta["portfolio_check_weight"])
+            else:
+                weight = round(convert.get_weight(posting).number, 2)
+            account = posting.account
+            portfolio = account.split(":")[1]
+            if weight > 0:
+                positivePortfolioSums[portfolio] += weight
+            else:
+                negativePortfolioSums[portfolio] += weight
+
+        portfolios = set(
+            list(positivePortfolioSums.keys()) + list(negativePortfolioSums.keys())
+        )
+        weight = None
+        for portfolio in portfolios:
+            positiveWeight = positivePortfolioSums[portfolio]
+            negativeWeight = -negativePortfolioSums[portfolio]
+            if not isclose(positiveWeight, negativeWeight, abs_tol=0.05):
+                errors.append(
+                    check_portfolio_sum.NonZeroWeightPerPortfolio(
+                        entry.meta,
+                        f"Weights for portfolio {portfolio} don't equal zero {positiveWeight} != {-negativeWeight}",
+                        entry,
+                    )
+                )
+            if (
+                weight
+                and weight != positiveWeight
+                and "skip_cross_portfolio_check" not in entry.meta
+            ):
+                errors.append(
+                    check_portfolio_sum.DifferentWeightPerPortfolio(
+                        entry.meta, "Not all portfolios have the same weight", entry
+                    )
+                )
+            weight = positiveWeight
+
+    return entries, errors
+
+
+def run(check, transactions):
+    return timeit.timeit(lambda: [check(t) for t in transactions], number=1)
+
+
+def main(count):
+    transactions = createTransactions(count)
+    original = timeit.timeit(lambda: originalCheck(transactions, {}), number=1)
+    serial = timeit.timeit(
+        lambda: check_portfolio_sum.check(transactions, {}), number=1
+    )
+    print(  # noqa: T201
+        f"{count} transactions: plugin {serial:.2f}s, "
+        f"original plugin {original:.2f}s ({original / serial:.1f}x)"
+    )
+
+    decimal = run(check_portfolio_sum._checkTransactionDecimal, transactions)
+    cents = run(check_portfolio_sum._checkTransaction, transactions)
+    print(  # noqa: T201
+        f"{count} transactions: fast path on cents {cents / count * 1e6:.2f}us, "
+        f"Decimal fallback {decimal / count * 1e6:.2f}us per transaction "
+        f"({decimal / cents:.1f}x)"
+    )
+
+    workers = max(os.cpu_count() or 1, 2)
+    parallel = timeit.timeit(
+        lambda: check_portfolio_sum.check(
+            transactions, {}, f"{{'workers': {workers}}}"
+        ),
+        number=1,
+    )
+    print(  # noqa: T201
+        f"{count} transactions, {os.cpu_count()} CPUs: serial {serial:.2f}s, "
+        f"{workers} workers {parallel:.2f}s ({serial / parallel:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
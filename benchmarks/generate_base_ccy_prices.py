@@ -0,0 +1,93 @@
+"""Benchmark of the existence check in the generate_base_ccy_prices plugin.
+
+Times the plugin with the per-pair date index against the former linear scan
+over a pair's prices, on instruments priced daily in USD and every other day
+in CHF, so that most generated prices need an existence check on a long
+history. Also times the incremental mode with a warm cache.
+
+    python benchmarks/generate_base_ccy_prices.py [sizes...]
+"""
+
+import sys
+import timeit
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from beancount.core import amount, data
+from beancount.core.number import D
+
+from tariochbctools.plugins import generate_base_ccy_prices
+
+HISTORY_DAYS = 3000
+INCREMENTAL = "{'baseCcy': 'CHF', 'incremental': True}"
+
+
+class LinearPriceDates(generate_base_ccy_prices._PriceDates):
+    """The existence check as it was before the date index."""
+
+    def contains(self, fxTuple, day):
+        if fxTuple in self.priceMap:
+            for alreadyExistingPriceDates in self.priceMap[fxTuple]:
+                if day == alreadyExistingPriceDates[0]:
+                    return True
+
+        return False
+
+    def add(self, fxTuple, day):
+        return not self.contains(fxTuple, day)
+
+
+def createPrices(count):
+    start = date(1990, 1, 1)
+    meta = data.new_metadata("benchmark", 0)
+    entries = [
+        data.Price(
+            meta, start + timedelta(days=i), "USD", amount.Amount(D("0.9"), "CHF")
+        )
+        for i in range(HISTORY_DAYS)
+    ]
+    instrument = 0
+    while len(entries) < count:
+        for i in range(HISTORY_DAYS):
+            day = start + timedelta(days=i)
+            entries.append(
+                data.Price(
+                    meta, day, f"STOCK{instrument}", amount.Amount(D("10"), "USD")
+                )
+            )
+            if i % 2:
+                entries.append(
+                    data.Price(
+                        meta, day, f"STOCK{instrument}", amount.Amount(D("9"), "CHF")
+                    )
+                )
+        instrument += 1
+
+    return entries[:count]
+
+
+def run(entries, config="CHF"):
+    return timeit.timeit(
+        lambda: generate_base_ccy_prices.generate(list(entries), {}, config), number=1
+    )
+
+
+def main(sizes):
+    for size in sizes:
+        entries = createPrices(size)
+        indexed = run(entries)
+        with patch.object(generate_base_ccy_prices, "_PriceDates", LinearPriceDates):
+            linear = run(entries)
+        generate_base_ccy_prices._memoryCache.clear()
+        run(entries, INCREMENTAL)
+        incremental = run(entries, INCREMENTAL)
+
+        print(  # noqa: T201
+            f"{size:>9} prices: date index {indexed:.2f}s, "
+            f"linear scan {linear:.2f}s ({linear / indexed:.1f}x), "
+            f"incremental warm {incremental:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main([int(s) for s in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,109 @@
+"""Benchmark of the shared HTTP client against a local mock server.
+
+Times a series of small GET requests sent with a fresh connection per call
+(module level requests.get, as the importers used to) against the shared
+client keeping its connections alive. If openssl is available, the server
+also runs with TLS on a self-signed certificate, where the handshakes cost
+the most.
+
+    python benchmarks/http_client.py [requests]
+"""
+
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+
+import requests
+
+from tariochbctools.importers.general import httpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send the headers and body in one segment, otherwise Nagle's algorithm
+    # and delayed acks stall every response on a kept alive connection
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def do_GET(self):
+        body = b'{"results": []}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def startServer(certFile=None):
+    server = ThreadingHTTPServer(("localhost", 0), Handler)
+    if certFile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certFile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def createCertificate(directory):
+    certFile = path.join(directory, "cert.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=DNS:localhost",
+            "-keyout",
+            certFile,
+            "-out",
+            certFile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certFile
+
+
+def run(scheme, certFile, count):
+    server = startServer(certFile)
+    url = f"{scheme}://localhost:{server.server_address[1]}/"
+    verify = certFile or True
+    client = httpClient.HttpClient()
+    try:
+        fresh = timeit.timeit(lambda: requests.get(url, verify=verify), number=count)
+        pooled = timeit.timeit(lambda: client.get(url, verify=verify), number=count)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(  # noqa: T201
+        f"{scheme:>5}, {count} requests: connection per request {fresh:.2f}s, "
+        f"shared client {pooled:.2f}s ({fresh / pooled:.1f}x)"
+    )
+
+
+def main(count):
+    run("http", None, count)
+    if shutil.which("openssl"):
+        with tempfile.TemporaryDirectory() as directory:
+            run("https", createCertificate(directory), count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,135 @@
+"""Benchmark of the dividend and withholding tax aggregation of the IBKR importer.
+
+Times the aggregation looking up the key of a cash transaction in a dict
+against the former scan over all earlier aggregates, on statements with a
+dividend and a withholding tax line per payment. The scan is quadratic, so it
+is only run up to LINEAR_LIMIT cash transactions.
+
+    python benchmarks/ibkr_cash_transactions.py [sizes...]
+"""
+
+import re
+import sys
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from ibflex import Types
+from ibflex.enums import CashAction
+
+from tariochbctools.importers.ibkr.importer import Importer, cleanupSymbol
+
+LINEAR_LIMIT = 10_000
+
+
+def matches(trx, t, account):
+    p = re.compile(r".* (?P<perShare>\d+\.?\d+) PER SHARE")
+
+    trxPerShareGroups = p.search(trx.description)
+    tPerShareGroups = p.search(t["description"])
+
+    trxPerShare = trxPerShareGroups.group("perShare") if trxPerShareGroups else ""
+    tPerShare = tPerShareGroups.group("perShare") if tPerShareGroups else ""
+
+    return (
+        t["date"] == trx.dateTime
+        and t["symbol"] == cleanupSymbol(trx.symbol)
+        and trxPerShare == tPerShare
+        and t["account"] == account
+    )
+
+
+class LinearImporter(Importer):
+    """The aggregation as it was before the lookup by key."""
+
+    def aggregateCashTransactions(self, cashTransactions, account):
+        transactions = []
+        for trx in cashTransactions:
+            existingEntry = None
+            if CashAction.DIVIDEND == trx.type or CashAction.WHTAX == trx.type:
+                existingEntry = next(
+                    (t for t in transactions if matches(trx, t, account)),
+                    None,
+                )
+
+            if existingEntry:
+                if CashAction.WHTAX == trx.type:
+                    existingEntry["whAmount"] += trx.amount
+                else:
+                    existingEntry["amount"] += trx.amount
+                    existingEntry["description"] = trx.description
+                    existingEntry["type"] = trx.type
+            else:
+                transactions.append(
+                    {
+                        "date": trx.dateTime,
+                        "symbol": cleanupSymbol(trx.symbol),
+                        "currency": trx.currency,
+                        "amount": 0 if CashAction.WHTAX == trx.type else trx.amount,
+                        "whAmount": trx.amount if CashAction.WHTAX == trx.type else 0,
+                        "description": trx.description,
+                        "type": trx.type,
+                        "account": account,
+                    }
+                )
+
+        return transactions
+
+
+def createCashTransactions(count):
+    start = datetime(2000, 1, 3, 20, 20)
+    cashTransactions = []
+    for i in range(count // 2):
+        symbol = f"S{i % 200}"
+        dateTime = start + timedelta(days=i // 200)
+        description = (
+            f"{symbol}(US0000000000) CASH DIVIDEND USD 0.{i % 90 + 10} PER SHARE"
+        )
+        cashTransactions.append(
+            Types.CashTransaction(
+                type=CashAction.WHTAX,
+                symbol=symbol,
+                currency="USD",
+                amount=Decimal("-0.15"),
+                dateTime=dateTime,
+                description=description + " - US TAX",
+            )
+        )
+        cashTransactions.append(
+            Types.CashTransaction(
+                type=CashAction.DIVIDEND,
+                symbol=symbol,
+                currency="USD",
+                amount=Decimal("1"),
+                dateTime=dateTime,
+                description=description + " (Ordinary Dividend)",
+            )
+        )
+
+    return cashTransactions
+
+
+def run(importer, cashTransactions):
+    return timeit.timeit(
+        lambda: importer.aggregateCashTransactions(cashTransactions, "U1"), number=1
+    )
+
+
+def main(sizes):
+    for size in sizes:
+        cashTransactions = createCashTransactions(size)
+        indexed = run(Importer(), cashTransactions)
+        if size > LINEAR_LIMIT:
+            linear = "skipped"
+        else:
+            seconds = run(LinearImporter(), cashTransactions)
+            linear = f"{seconds:.2f}s ({seconds / indexed:.0f}x)"
+
+        print(  # noqa: T201
+            f"{size:>7} cash transactions: lookup by key {indexed:.3f}s, "
+            f"linear scan {linear}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(s) for s in sys.argv[1:]] or [100, 1_000, 10_000, 100_000])
@@ -0,0 +1,89 @@
+"""Benchmark of the decoding of the GoCardless (Nordigen) transactions response.
+
+Compares time and peak memory of building the entries while the response is
+decoded incrementally against decoding the whole response first and sorting
+the transactions, on responses with the given number of booked transactions.
+
+    python benchmarks/nordigen_transactions.py [sizes...]
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from tariochbctools.importers.general import jsonStream
+from tariochbctools.importers.nordigen.importer import CHUNK_SIZE, Importer
+
+
+def createResponse(count):
+    start = date(2022, 1, 1)
+    booked = [
+        {
+            "transactionId": f"T{i}",
+            "bookingDate": (start + timedelta(days=(i * 7919) % 730)).isoformat(),
+            "valueDate": (start + timedelta(days=(i * 7919) % 730)).isoformat(),
+            "transactionAmount": {
+                "amount": f"-{i % 1000}.{i % 100:02}",
+                "currency": "CHF",
+            },
+            "creditorName": f"Shop {i % 500}",
+            "remittanceInformationUnstructured": f"Payment {i} card 1234 " * 3,
+            "proprietaryBankTransactionCode": "CARD_PAYMENT",
+        }
+        for i in range(count)
+    ]
+    return json.dumps({"transactions": {"booked": booked, "pending": []}}).encode()
+
+
+def chunks(content):
+    return (content[i : i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE))
+
+
+def streamed(importer, content):
+    keys = []
+    entries = []
+    for trx in jsonStream.iterItems(chunks(content), ("transactions", "booked")):
+        keys.append((trx["bookingDate"], len(entries)))
+        entries.append(importer._createEntry(trx, "Assets:Bank:CHF"))
+    return [entries[index] for _, index in sorted(keys)]
+
+
+def decodedAtOnce(importer, content):
+    transactions = json.loads(b"".join(chunks(content)))["transactions"]["booked"]
+    return [
+        importer._createEntry(trx, "Assets:Bank:CHF")
+        for trx in sorted(transactions, key=lambda trx: trx["bookingDate"])
+    ]
+
+
+def run(decode, importer, content):
+    tracemalloc.start()
+    start = time.perf_counter()
+    entries = decode(importer, content)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return entries, seconds, peak / 1024 / 1024
+
+
+def main(sizes):
+    importer = Importer()
+    for size in sizes:
+        content = createResponse(size)
+        streamedEntries, streamedSeconds, streamedPeak = run(
+            streamed, importer, content
+        )
+        entries, seconds, peak = run(decodedAtOnce, importer, content)
+        assert streamedEntries == entries
+
+        print(  # noqa: T201
+            f"{size:>7} transactions ({len(content) / 1024 / 1024:.0f} MB): "
+            f"streamed {streamedSeconds:.2f}s {streamedPeak:.0f} MB peak, "
+            f"at once {seconds:.2f}s {peak:.0f} MB peak"
+        )
+
+
+if __name__ == "__main__":
+    main([int(s) for s in sys.argv[1:]] or [1_000, 10_000, 100_000])
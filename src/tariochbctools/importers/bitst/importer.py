@@ -1,4 +1,6 @@
-from datetime import date
+import json
+import os
+from datetime import date, datetime
 from os import path
 from typing import Any
 
@@ -13,6 +15,13 @@ from dateutil.relativedelta import relativedelta
 from tariochbctools.importers.general.deduplication import ReferenceDuplicatesComparator
 from tariochbctools.importers.general.priceLookup import PriceLookup
 
+# The maximum limit of user_transactions
+PAGE_SIZE = 1000
+
+
+def trxDate(trx: dict[str, Any]) -> date:
+    return datetime.fromisoformat(trx["datetime"]).date()
+
 
 class Importer(beangulp.Importer):
     """An importer for Bitstamp."""
@@ -39,15 +48,72 @@ class Importer(beangulp.Importer):
 
         dateCutoff = date.today() + relativedelta(months=-config["monthCutoff"])
 
-        trxs = self.client.user_transactions()
-        trxs.reverse()
-        result = []
-        for trx in trxs:
-            entry = self.fetchSingle(trx)
-            if entry.date > dateCutoff:
-                result.append(entry)
-
-        return result
+        cachePath = None
+        if "cacheFile" in config:
+            cachePath = path.join(path.dirname(filepath), config["cacheFile"])
+        trxs = [
+            trx
+            for trx in self.fetchTransactions(dateCutoff, cachePath)
+            if trxDate(trx) > dateCutoff
+        ]
+        self.priceLookup.prefetch(
+            (ccy.upper(), trxDate(trx))
+            for trx in trxs
+            for ccy in self.currencies
+            if ccy in trx
+        )
+        return [self.fetchSingle(trx) for trx in trxs]
+
+    def fetchTransactions(
+        self, dateCutoff: date, cachePath: str | None = None
+    ) -> list[dict[str, Any]]:
+        """The raw transactions back to dateCutoff at least, oldest first.
+
+        The transactions are fetched newest first, page by page, until a page
+        reaches back to dateCutoff. With a cachePath, the fetched transactions
+        are kept in it, and paging stops as soon as the cached ones are
+        reached, if they reach back to dateCutoff.
+        """
+        cached = {}
+        coveredSince = None
+        if cachePath and path.isfile(cachePath):
+            with open(cachePath, "r") as f:
+                cache = json.load(f)
+            cached = {int(id): trx for id, trx in cache["transactions"].items()}
+            coveredSince = cache["coveredSince"]
+
+        # all the transactions after the day the cached ones reach back to
+        # are cached
+        cacheCovers = coveredSince is not None and coveredSince[:10] <= str(dateCutoff)
+        fetched = {}
+        reachedCache = False
+        offset = 0
+        while True:
+            page = self.client.user_transactions(offset=offset, limit=PAGE_SIZE)
+            for trx in page:
+                fetched[int(trx["id"])] = trx
+            reachedCache = reachedCache or any(int(t["id"]) in cached for t in page)
+
+            if len(page) < PAGE_SIZE:
+                # the first transaction of the account
+                oldest = ""
+                break
+            oldest = page[-1]["datetime"]
+            if trxDate(page[-1]) <= dateCutoff or (reachedCache and cacheCovers):
+                break
+            offset += len(page)
+
+        if reachedCache and coveredSince is not None:
+            oldest = min(oldest, coveredSince)
+        transactions = cached | fetched
+
+        if cachePath:
+            tmpPath = cachePath + ".tmp"
+            with open(tmpPath, "w") as f:
+                json.dump({"coveredSince": oldest, "transactions": transactions}, f)
+            os.replace(tmpPath, cachePath)
+
+        return [transactions[id] for id in sorted(transactions)]
 
     def fetchSingle(self, trx: dict[str, Any]) -> data.Transaction:
         id = int(trx["id"])
@@ -169,3 +235,6 @@ class Importer(beangulp.Importer):
         )
 
     cmp = ReferenceDuplicatesComparator()
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
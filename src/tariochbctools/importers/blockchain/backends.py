@@ -0,0 +1,117 @@
+"""Where the blockchain importer gets the transactions of an address from.
+
+A backend has one method,
+addressDetails(address, currency, afterBlockHeight, beforeBlockHeight), which
+returns the details of address as blockcypher.get_address_details does: a dict
+with the confirmed "txrefs" of the blocks after afterBlockHeight and before
+beforeBlockHeight (unbounded if None), newest first, with "confirmed" parsed to
+a datetime. If not all of them fit into the response, "hasMore" is set.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from os import path
+from typing import Any
+
+import blockcypher
+from blockcypher.api import RateLimitError
+
+from tariochbctools.importers.general import httpClient
+
+# The public api allows 3 requests per second without an api key
+DEFAULT_REQUESTS_PER_SECOND = 3
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_BACKOFF = 1
+# The most txrefs the api returns in one response
+TXN_LIMIT = 2000
+
+
+class Throttle:
+    """Spaces out the requests of all threads to at most ratePerSecond."""
+
+    def __init__(self, ratePerSecond: float):
+        self.interval = 1 / ratePerSecond
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next)
+            self.next = start + self.interval
+        time.sleep(start - now)
+
+
+class BlockCypherBackend:
+    """The BlockCypher api, throttled to requestsPerSecond. Rate limited
+    requests are retried with an exponential backoff."""
+
+    def __init__(
+        self,
+        apiKey: str | None = None,
+        requestsPerSecond: float = DEFAULT_REQUESTS_PER_SECOND,
+    ):
+        self.apiKey = apiKey
+        self.throttle = Throttle(requestsPerSecond)
+
+    def addressDetails(
+        self,
+        address: str,
+        currency: str,
+        afterBlockHeight: int | None,
+        beforeBlockHeight: int | None = None,
+    ) -> dict[str, Any]:
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            self.throttle.wait()
+            try:
+                return blockcypher.get_address_details(
+                    address,
+                    coin_symbol=currency.lower(),
+                    txn_limit=TXN_LIMIT,
+                    api_key=self.apiKey,
+                    before_bh=beforeBlockHeight,
+                    after_bh=afterBlockHeight,
+                )
+            except RateLimitError:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                time.sleep(RATE_LIMIT_BACKOFF * 2**attempt)
+
+
+class ReplayBackend:
+    """Replays address details recorded from the BlockCypher api, e.g. with
+
+        curl https://api.blockcypher.com/v1/btc/main/addrs/ADDRESS > btc-ADDRESS.json
+
+    The files are named <currency>-<address>.json and read from the directory
+    or the http(s) url source (served e.g. by python -m http.server).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+
+    def addressDetails(
+        self,
+        address: str,
+        currency: str,
+        afterBlockHeight: int | None,
+        beforeBlockHeight: int | None = None,
+    ) -> dict[str, Any]:
+        name = f"{currency.lower()}-{address}.json"
+        if self.source.startswith(("http://", "https://")):
+            r = httpClient.sharedClient().get(f"{self.source.rstrip('/')}/{name}")
+            r.raise_for_status()
+            details = r.json()
+        else:
+            with open(path.join(self.source, name), "r") as f:
+                details = json.load(f)
+
+        details["txrefs"] = [
+            dict(txref, confirmed=datetime.fromisoformat(txref["confirmed"]))
+            for txref in details.get("txrefs", [])
+            if (afterBlockHeight is None or txref["block_height"] > afterBlockHeight)
+            and (beforeBlockHeight is None or txref["block_height"] < beforeBlockHeight)
+        ]
+        return details
@@ -1,4 +1,7 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 from os import path
+from typing import Any
 
 import beangulp
 import blockcypher
@@ -6,12 +9,27 @@ import yaml
 from beancount.core import amount, data
 from beancount.core.number import D
 
+from tariochbctools.importers.blockchain.backends import (
+    DEFAULT_REQUESTS_PER_SECOND,
+    BlockCypherBackend,
+    ReplayBackend,
+)
+from tariochbctools.importers.blockchain.txrefCache import TxrefCache
 from tariochbctools.importers.general.deduplication import ReferenceDuplicatesComparator
 from tariochbctools.importers.general.priceLookup import PriceLookup
 
+DEFAULT_CONCURRENCY = 3
+
 
 class Importer(beangulp.Importer):
-    """An importer for Blockchain data."""
+    """An importer for Blockchain data.
+
+    The transactions are looked up with backend, by default the one configured
+    in blockchain.yaml (see backends).
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
 
     def identify(self, filepath: str) -> bool:
         return path.basename(filepath).endswith("blockchain.yaml")
@@ -26,13 +44,24 @@ class Importer(beangulp.Importer):
         baseCcy = config["base_ccy"]
         priceLookup = PriceLookup(existing, baseCcy)
 
+        cacheDir = config.get("cache_dir")
+        if cacheDir:
+            cacheDir = path.join(path.dirname(filepath), cacheDir)
+        backend = self.backend or self.configuredBackend(filepath)
+        with ThreadPoolExecutor(
+            max_workers=config.get("concurrency", DEFAULT_CONCURRENCY)
+        ) as executor:
+            addressesTxrefs = list(
+                executor.map(
+                    lambda address: self.fetchTxrefs(backend, address, cacheDir),
+                    self.config["addresses"],
+                )
+            )
+
         entries = []
-        for address in self.config["addresses"]:
+        for address, txrefs in zip(self.config["addresses"], addressesTxrefs):
             currency = address["currency"]
-            addressDetails = blockcypher.get_address_details(
-                address["address"], coin_symbol=currency.lower()
-            )
-            for trx in addressDetails["txrefs"]:
+            for trx in txrefs:
                 metakv = {
                     "ref": trx["tx_hash"],
                 }
@@ -68,4 +97,69 @@ class Importer(beangulp.Importer):
 
         return entries
 
+    def configuredBackend(self, filepath: str):
+        if "replay" in self.config:
+            source = self.config["replay"]
+            if not source.startswith(("http://", "https://")):
+                source = path.join(path.dirname(filepath), source)
+            return ReplayBackend(source)
+
+        return BlockCypherBackend(
+            self.config.get("api_key"),
+            self.config.get("requests_per_second", DEFAULT_REQUESTS_PER_SECOND),
+        )
+
+    def fetchTxrefs(
+        self, backend, address: dict[str, str], cacheDir: str | None
+    ) -> list[dict[str, Any]]:
+        """The txrefs of address, only the ones of blocks newer than the cache
+        in cacheDir are fetched."""
+        currency = address["currency"].lower()
+        cache = TxrefCache(
+            path.join(cacheDir, f"{currency}-{address['address']}.json")
+            if cacheDir
+            else None
+        )
+
+        txrefs = cache.merge(
+            self.fetchNewTxrefs(
+                backend, address["address"], currency, cache.blockHeight()
+            )
+        )
+        if cacheDir:
+            os.makedirs(cacheDir, exist_ok=True)
+            cache.save()
+
+        return txrefs
+
+    def fetchNewTxrefs(
+        self, backend, address: str, currency: str, afterBlockHeight: int | None
+    ) -> list[dict[str, Any]]:
+        """All txrefs of the blocks after afterBlockHeight. While the response
+        is truncated (hasMore), the older blocks are paged down with
+        beforeBlockHeight, so that the cache never skips over missing ones."""
+        txrefs: list[dict[str, Any]] = []
+        beforeBlockHeight = None
+        while True:
+            addressDetails = backend.addressDetails(
+                address, currency, afterBlockHeight, beforeBlockHeight
+            )
+            page = addressDetails.get("txrefs", [])
+            if not addressDetails.get("hasMore") or not page:
+                return txrefs + page
+
+            # The response can end within its lowest block, so that block is
+            # fetched again with the next page, unless it is all there is
+            lowest = min(txref["block_height"] for txref in page)
+            complete = [txref for txref in page if txref["block_height"] > lowest]
+            if complete:
+                txrefs.extend(complete)
+                beforeBlockHeight = lowest + 1
+            else:
+                txrefs.extend(page)
+                beforeBlockHeight = lowest
+
     cmp = ReferenceDuplicatesComparator()
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
@@ -0,0 +1,82 @@
+"""The confirmed transactions of an address, kept in a JSON file keyed by
+tx_hash, so that only the transactions of newer blocks have to be fetched.
+
+Only transactions with at least MIN_CONFIRMATIONS are cached, blocks that
+deep aren't reorganised anymore.
+"""
+
+import json
+import os
+from datetime import datetime
+from os import path
+from typing import Any
+
+MIN_CONFIRMATIONS = 6
+
+
+class TxrefCache:
+    def __init__(self, cachePath: str | None):
+        self.cachePath = cachePath
+        self.txrefs: dict[str, list[dict[str, Any]]] = {}
+        self.changed = False
+        if cachePath and path.isfile(cachePath):
+            with open(cachePath, "r") as f:
+                self.txrefs = {
+                    txHash: [_load(txref) for txref in txrefs]
+                    for txHash, txrefs in json.load(f).items()
+                }
+
+    def blockHeight(self) -> int | None:
+        """The height of the newest cached block, the transactions of all
+        blocks up to it are cached."""
+        return max(
+            (
+                txref["block_height"]
+                for txrefs in self.txrefs.values()
+                for txref in txrefs
+            ),
+            default=None,
+        )
+
+    def merge(self, txrefs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """The fetched txrefs of the blocks after blockHeight followed by the
+        cached ones. The fetched ones that are confirmed are added to the cache.
+        """
+        fetched = {}
+        for txref in txrefs:
+            fetched.setdefault(txref["tx_hash"], []).append(txref)
+
+        merged = list(txrefs)
+        for txHash, cached in self.txrefs.items():
+            if txHash not in fetched:
+                merged.extend(cached)
+
+        for txHash, fetchedTxrefs in fetched.items():
+            if all(t["confirmations"] >= MIN_CONFIRMATIONS for t in fetchedTxrefs):
+                self.txrefs[txHash] = fetchedTxrefs
+                self.changed = True
+
+        return merged
+
+    def save(self) -> None:
+        if not self.cachePath or not self.changed:
+            return
+
+        tmpPath = self.cachePath + ".tmp"
+        with open(tmpPath, "w") as f:
+            json.dump(
+                {
+                    txHash: [_dump(txref) for txref in txrefs]
+                    for txHash, txrefs in self.txrefs.items()
+                },
+                f,
+            )
+        os.replace(tmpPath, self.cachePath)
+
+
+def _load(txref: dict[str, Any]) -> dict[str, Any]:
+    return dict(txref, confirmed=datetime.fromisoformat(txref["confirmed"]))
+
+
+def _dump(txref: dict[str, Any]) -> dict[str, Any]:
+    return dict(txref, confirmed=txref["confirmed"].isoformat())
@@ -1,3 +1,82 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from beancount.core import data
+from beangulp.extract import DUPLICATE
+
+INDEXED_REFS = ("ref", "nordref", "zakref", "transaction_id")
+
+
+class ReferenceIndex:
+    """A hash index of existing entries by their reference metadata.
+
+    The index is built once per list of existing entries and extended in place
+    when new entries are appended to that list (as beangulp does after each
+    importer ran), so that it can be shared by all importers of a run.
+    """
+
+    _cached = None
+
+    def __init__(self, existing: data.Entries, refs):
+        self.existing = existing
+        self.refs = frozenset(refs)
+        self.entries = defaultdict(list)
+        self.count = 0
+        self.update()
+
+    @classmethod
+    def get(cls, existing: data.Entries, refs) -> "ReferenceIndex":
+        index = cls._cached
+        if (
+            index is None
+            or index.existing is not existing
+            or not index.refs.issuperset(refs)
+            or not index.isPrefixUnchanged()
+        ):
+            index = cls(existing, set(INDEXED_REFS).union(refs))
+            cls._cached = index
+        else:
+            index.update()
+
+        return index
+
+    @classmethod
+    def invalidate(cls) -> None:
+        cls._cached = None
+
+    def isPrefixUnchanged(self) -> bool:
+        if self.count == 0:
+            return True
+        if len(self.existing) < self.count:
+            return False
+
+        return (
+            self.existing[0] is self.first
+            and self.existing[self.count - 1] is self.last
+        )
+
+    def update(self) -> None:
+        for entry in self.existing[self.count :]:
+            if not entry.meta:
+                continue
+            for ref in self.refs:
+                if ref in entry.meta:
+                    self.entries[ref, entry.meta[ref]].append(entry)
+
+        self.count = len(self.existing)
+        if self.count:
+            self.first = self.existing[0]
+            self.last = self.existing[-1]
+
+    def lookup(self, values, refs) -> list[data.Directive]:
+        matches = []
+        for value in values:
+            for ref in refs:
+                matches.extend(self.entries.get((ref, value), ()))
+
+        return matches
+
+
 class ReferenceDuplicatesComparator:
     def __init__(self, refs=["ref"]):
         self.refs = refs
@@ -12,3 +91,25 @@ class ReferenceDuplicatesComparator:
                 entry2Refs.add(entry2.meta[ref])
 
         return entry1Refs & entry2Refs
+
+    def deduplicate(
+        self,
+        entries: data.Entries,
+        existing: data.Entries,
+        window: timedelta = timedelta(days=2),
+    ) -> None:
+        """Mark duplicates like beangulp does, but look them up in a ReferenceIndex.
+
+        Instead of comparing every new entry with all existing entries in the
+        date window, only the existing entries sharing a reference are checked.
+        """
+        index = ReferenceIndex.get(existing, self.refs)
+        for entry in entries:
+            values = {entry.meta[ref] for ref in self.refs if ref in entry.meta}
+            if not values:
+                continue
+
+            candidates = index.lookup(values, self.refs)
+            for target in sorted(candidates, key=lambda e: e.date):
+                if abs(target.date - entry.date) <= window:
+                    entry.meta[DUPLICATE] = target
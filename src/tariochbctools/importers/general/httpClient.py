@@ -0,0 +1,157 @@
+"""A shared HTTP client for the importers talking to web APIs.
+
+The client is a requests session, so connections are kept alive and reused
+between requests (and importers) instead of doing a TCP and TLS handshake per
+call. It also adds a default timeout, retries with exponential backoff on
+connection errors and 5xx responses of idempotent requests, and limits the
+number of concurrent requests per host.
+
+A 429 response pauses all requests to its host for the time the server asks
+for (Retry-After), after which the request is sent again. Waits longer than
+MAX_RETRY_AFTER, like a daily rate limit, aren't waited for; the 429 response
+is returned instead.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import InvalidHeader
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_HOST_LIMIT = 4
+POOL_SIZE = 16
+RETRY_STATUSES = (500, 502, 503, 504)
+MAX_RETRY_AFTER = 60
+
+
+class ServerErrorRetry(Retry):
+    """Retries that leave 429 responses to the adapter and wait at most
+    MAX_RETRY_AFTER for the Retry-After of a 503."""
+
+    RETRY_AFTER_STATUS_CODES = frozenset({413, 503})
+
+    def get_retry_after(self, response):
+        retryAfter = super().get_retry_after(response)
+        return None if retryAfter is None else min(retryAfter, MAX_RETRY_AFTER)
+
+
+class HostLimitedAdapter(HTTPAdapter):
+    """An adapter that only sends a limited number of requests per host at once."""
+
+    def __init__(
+        self,
+        hostLimit: int = DEFAULT_HOST_LIMIT,
+        rateLimitRetries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        **kwargs,
+    ):
+        self.hostLimit = hostLimit
+        self.rateLimitRetries = rateLimitRetries
+        self.backoff = backoff
+        self.hostLimits: dict[str, int] = {}
+        self.semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self.semaphoresLock = threading.Lock()
+        self.pausedUntil: dict[str, float] = {}
+        super().__init__(**kwargs)
+
+    def setHostLimit(self, host: str, limit: int) -> None:
+        with self.semaphoresLock:
+            self.hostLimits[host] = limit
+            self.semaphores.pop(host, None)
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self.semaphoresLock:
+            if host not in self.semaphores:
+                limit = self.hostLimits.get(host, self.hostLimit)
+                self.semaphores[host] = threading.BoundedSemaphore(limit)
+            return self.semaphores[host]
+
+    def _waitForHost(self, host: str) -> None:
+        while True:
+            with self.semaphoresLock:
+                delay = self.pausedUntil.get(host, 0) - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def _pauseHost(self, host: str, delay: float) -> None:
+        with self.semaphoresLock:
+            until = time.monotonic() + delay
+            self.pausedUntil[host] = max(self.pausedUntil.get(host, 0), until)
+
+    def _retryAfter(self, response, attempt: int) -> float | None:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return self.backoff * 2**attempt
+        try:
+            return Retry().parse_retry_after(value)
+        except InvalidHeader:
+            return None
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).netloc
+        attempt = 0
+        while True:
+            self._waitForHost(host)
+            with self._semaphore(host):
+                response = super().send(request, **kwargs)
+
+            if response.status_code != 429 or attempt >= self.rateLimitRetries:
+                return response
+            delay = self._retryAfter(response, attempt)
+            if delay is None or delay > MAX_RETRY_AFTER:
+                return response
+
+            response.close()
+            self._pauseHost(host, delay)
+            attempt += 1
+
+
+class HttpClient(requests.Session):
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        hostLimit: int = DEFAULT_HOST_LIMIT,
+    ):
+        super().__init__()
+        self.timeout = timeout
+        retry = ServerErrorRetry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=RETRY_STATUSES,
+            raise_on_status=False,
+        )
+        self.adapter = HostLimitedAdapter(
+            hostLimit, retries, backoff, pool_maxsize=POOL_SIZE, max_retries=retry
+        )
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+
+    def setHostLimit(self, host: str, limit: int) -> None:
+        """Allow limit concurrent requests to host (e.g. "api.truelayer.com")."""
+        self.adapter.setHostLimit(host, limit)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+_client = None
+_clientLock = threading.Lock()
+
+
+def sharedClient() -> HttpClient:
+    """The client shared by all importers of the process."""
+    global _client
+    with _clientLock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,114 @@
+"""Incremental decoding of large JSON documents.
+
+Only the containers on the way to an array are walked through, the items of
+the array are decoded one by one as soon as they have been received. Values
+next to the path (e.g. the pending transactions besides the booked ones) are
+decoded and dropped. So only one item, and not the whole document, has to be
+held in memory at a time.
+"""
+
+import codecs
+import json
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+
+class _Reader:
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> bool:
+        if self.eof:
+            return False
+        try:
+            chunk = self.utf8.decode(next(self.chunks))
+        except StopIteration:
+            chunk = self.utf8.decode(b"", final=True)
+            self.eof = True
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(
+                f"Expected one of {chars!r} but got {char or 'end of data'!r}"
+            )
+        self.pos += 1
+        return char
+
+    def _readMore(self) -> bool:
+        """Read until the unread part of the buffer has doubled, so that a
+        value spanning many chunks isn't decoded again for every chunk."""
+        needed = 2 * (len(self.buffer) - self.pos) + 1
+        hasRead = False
+        while len(self.buffer) - self.pos < needed and self._read():
+            hasRead = True
+        return hasRead
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._readMore():
+                    raise
+                continue
+            # A number at the end of the buffer could go on in the next chunk
+            truncated = end == len(self.buffer) or self.buffer[end] in NUMBER_CHARS
+            if not truncated or not self._readMore():
+                self.pos = end
+                return value
+
+
+def iterItems(chunks: Iterable[bytes], path: Iterable[str]) -> Iterator[Any]:
+    """The items of the array found under the keys of path in the JSON object
+    sent in chunks. Nothing if there is no such array.
+    """
+    reader = _Reader(chunks)
+    yield from _iterItems(reader, list(path))
+
+
+def _iterItems(reader: _Reader, path: list[str]) -> Iterator[Any]:
+    if not path:
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.pos += 1
+            return
+        while True:
+            yield reader.value()
+            if reader.expect(",]") == "]":
+                return
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == path[0] and reader.peek() != "n":
+            yield from _iterItems(reader, path[1:])
+        else:
+            reader.value()
+        if reader.expect(",}") == "}":
+            return
@@ -72,6 +72,9 @@ class Importer(beangulp.Importer):
 
     cmp = ReferenceDuplicatesComparator()
 
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
+
     def prepare_payee(self, trxdata: dict[str, Any]) -> str:
         return ""
 
@@ -1,18 +1,138 @@
+import logging
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from collections.abc import Iterable
 from datetime import date
+from decimal import Decimal
+from operator import itemgetter
+from os import environ
 
 from beancount.core import amount, data, prices
 from beancount.core.number import D
 
+from tariochbctools.importers.general import priceSnapshot
+
+CacheInfo = namedtuple("CacheInfo", "hits misses")
+
+
+class PriceMapCache:
+    """Shares one price map between all importers of a run.
+
+    The map is reused as long as the same existing entries are passed in, or
+    as long as they contain the same Price entries (beangulp appends the
+    extracted entries to the existing ones after each importer).
+
+    If snapshotPath is set (by default from the TARIOCHBCTOOLS_PRICE_SNAPSHOT
+    environment variable), a miss first tries to load the price map from that
+    snapshot and writes a new one if it is out of date.
+    """
+
+    def __init__(self, snapshotPath: str | None = None):
+        self.snapshotPath = snapshotPath
+        self.hits = 0
+        self.misses = 0
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        self.existing = None
+        self.count = 0
+        self.priceEntries = None
+        self.priceIds = None
+        self.priceMap = None
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses)
+
+    def get(self, existing: data.Entries) -> prices.PriceMap:
+        if existing is self.existing and len(existing) == self.count:
+            self.hits += 1
+            return self.priceMap
+
+        priceEntries = [e for e in existing if isinstance(e, data.Price)]
+        priceIds = frozenset(map(id, priceEntries))
+        if self.priceMap is not None and priceIds == self.priceIds:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.priceMap = self._load(priceEntries)
+
+        # keep the price entries referenced so that their ids stay unique
+        self.priceEntries = priceEntries
+        self.priceIds = priceIds
+        self.existing = existing
+        self.count = len(existing)
+        return self.priceMap
+
+    def _load(self, priceEntries: data.Entries) -> prices.PriceMap:
+        if not self.snapshotPath:
+            return prices.build_price_map(priceEntries)
+
+        priceDigest = priceSnapshot.digest(priceEntries)
+        priceMap = priceSnapshot.load(self.snapshotPath, priceDigest)
+        if priceMap is None:
+            priceMap = prices.build_price_map(priceEntries)
+            try:
+                priceSnapshot.save(self.snapshotPath, priceMap, priceDigest)
+            except (OSError, ValueError) as e:
+                logging.warning("Could not write price snapshot: %s", e)
+
+        return priceMap
+
+
+priceMapCache = PriceMapCache(environ.get("TARIOCHBCTOOLS_PRICE_SNAPSHOT"))
+
 
 class PriceLookup:
     def __init__(self, existing: data.Entries, baseCcy: str):
         if existing:
-            self.priceMap = prices.build_price_map(existing)
+            self.priceMap = priceMapCache.get(existing)
         else:
             self.priceMap = None
         self.baseCcy = baseCcy
+        self.prefetched: dict[tuple[str, date], Decimal | None] = {}
+
+    def fetchPriceAmounts(
+        self, queries: Iterable[tuple[str, date]]
+    ) -> list[Decimal | None]:
+        """Resolve many (instrument, date) pairs at once.
+
+        The queries are sorted by date per instrument and each price series is
+        searched only from the position of the previous query onwards.
+        Returns the amounts in the order of the queries.
+        """
+        queries = list(queries)
+        if not self.priceMap:
+            return [D(1)] * len(queries)
+
+        byInstrument = defaultdict(list)
+        for i, (instrument, day) in enumerate(queries):
+            byInstrument[instrument].append((day, i))
+
+        result: list[Decimal | None] = [None] * len(queries)
+        for instrument, dated in byInstrument.items():
+            if instrument == self.baseCcy:
+                for _, i in dated:
+                    result[i] = D(1)
+                continue
+
+            priceList = self.priceMap.get((instrument, self.baseCcy)) or []
+            dated.sort()
+            pos = 0
+            for day, i in dated:
+                pos = bisect_right(priceList, day, lo=pos, key=itemgetter(0))
+                if pos:
+                    result[i] = priceList[pos - 1][1]
+
+        return result
+
+    def prefetch(self, queries: Iterable[tuple[str, date]]) -> None:
+        """Resolve the queries in bulk so that fetchPriceAmount can serve them."""
+        queries = list(queries)
+        self.prefetched.update(zip(queries, self.fetchPriceAmounts(queries)))
 
     def fetchPriceAmount(self, instrument: str, date: date) -> data.Amount:
+        if (instrument, date) in self.prefetched:
+            return self.prefetched[instrument, date]
         if self.priceMap:
             price = prices.get_price(
                 self.priceMap, tuple([instrument, self.baseCcy]), date
@@ -0,0 +1,155 @@
+"""An on-disk snapshot of a price map.
+
+The snapshot stores, per currency pair, the sorted dates as day ordinals and
+the rates as scaled integers (coefficient and exponent), so that a price map
+can be memory-mapped and decoded lazily instead of being rebuilt from the
+ledger. It is keyed on a hash over the date, currency and rate of every Price
+entry, so it is rebuilt whenever a price changes, also one generated by a
+plugin.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from datetime import date
+from decimal import Decimal
+
+from beancount.core import data, prices
+
+MAGIC = b"TBCPRICE"
+VERSION = 2
+HEADER = struct.Struct("<8sII")
+RATE_BYTES = 16
+
+
+class SnapshotPriceMap(prices.PriceMap):
+    """A price map whose price lists are decoded from the snapshot on first use."""
+
+    __slots__ = ("buffer", "pending")
+
+    def __init__(self, buffer, pending, forwardPairs):
+        super().__init__(dict.fromkeys(pending))
+        self.buffer = buffer
+        self.pending = pending
+        self.forward_pairs = forwardPairs
+
+    def __getitem__(self, basequote):
+        if basequote in self.pending:
+            offset, count = self.pending.pop(basequote)
+            dict.__setitem__(self, basequote, _decode(self.buffer, offset, count))
+        return dict.__getitem__(self, basequote)
+
+    def get(self, basequote, default=None):
+        if basequote in self:
+            return self[basequote]
+        return default
+
+    def values(self):
+        return [self[k] for k in self]
+
+    def items(self):
+        return [(k, self[k]) for k in self]
+
+
+def digest(priceEntries: data.Entries) -> str:
+    """A hash over the date, currency and rate of the price entries."""
+    content = "\n".join(
+        [
+            " ".join(
+                (
+                    str(e.date.toordinal()),
+                    e.currency,
+                    str(e.amount.number),
+                    e.amount.currency,
+                )
+            )
+            for e in priceEntries
+        ]
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _encodeRate(rate: Decimal) -> bytes:
+    sign, digits, exponent = rate.as_tuple()
+    if not isinstance(exponent, int) or not -128 <= exponent <= 127:
+        raise ValueError(f"Rate {rate} can't be stored in the snapshot")
+    coefficient = int("".join(map(str, digits)) or "0")
+    if sign:
+        coefficient = -coefficient
+
+    return coefficient.to_bytes(RATE_BYTES, "little", signed=True) + struct.pack(
+        "<b", exponent
+    )
+
+
+def _decode(buffer, offset: int, count: int) -> list[tuple[date, Decimal]]:
+    ordinals = buffer[offset : offset + 4 * count].cast("i")
+    rateOffset = offset + 4 * count
+    result = []
+    for i, ordinal in enumerate(ordinals):
+        start = rateOffset + i * (RATE_BYTES + 1)
+        coefficient = int.from_bytes(
+            buffer[start : start + RATE_BYTES], "little", signed=True
+        )
+        exponent = struct.unpack_from("<b", buffer, start + RATE_BYTES)[0]
+        rate = Decimal(f"{coefficient}E{exponent}")
+        result.append((date.fromordinal(ordinal), rate))
+
+    return result
+
+
+def save(path: str, priceMap: prices.PriceMap, priceDigest: str) -> None:
+    """Write the price map to path, replacing any previous snapshot atomically."""
+    pairs = []
+    body = bytearray()
+    for (base, quote), priceList in priceMap.items():
+        pairs.append([base, quote, len(body), len(priceList)])
+        body += struct.pack(
+            f"<{len(priceList)}i", *(d.toordinal() for d, _ in priceList)
+        )
+        for _, rate in priceList:
+            body += _encodeRate(rate)
+
+    header = json.dumps(
+        {
+            "digest": priceDigest,
+            "forwardPairs": getattr(priceMap, "forward_pairs", []),
+            "pairs": pairs,
+        }
+    ).encode("utf-8")
+
+    tmpPath = path + ".tmp"
+    with open(tmpPath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        f.write(body)
+    os.replace(tmpPath, path)
+
+
+def load(path: str, priceDigest: str) -> SnapshotPriceMap | None:
+    """Map the snapshot at path, None if it is missing or out of date."""
+    try:
+        with open(path, "rb") as f:
+            buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except (OSError, ValueError):
+        return None
+
+    if len(buffer) < HEADER.size:
+        return None
+    magic, version, headerSize = HEADER.unpack_from(buffer)
+    if magic != MAGIC or version != VERSION:
+        return None
+
+    header = json.loads(bytes(buffer[HEADER.size : HEADER.size + headerSize]))
+    if header["digest"] != priceDigest:
+        return None
+
+    bodyOffset = HEADER.size + headerSize
+    pending = {
+        (base, quote): (bodyOffset + offset, count)
+        for base, quote, offset, count in header["pairs"]
+    }
+    forwardPairs = [tuple(p) for p in header["forwardPairs"]]
+    return SnapshotPriceMap(buffer, pending, forwardPairs)
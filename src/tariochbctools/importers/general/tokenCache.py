@@ -0,0 +1,124 @@
+"""A cache of API access tokens, so that repeated runs can skip the auth round
+trip as long as the last token is valid.
+
+The cache is enabled by setting the environment variable
+``TARIOCHBCTOOLS_TOKEN_CACHE`` to a directory and needs the optional
+``cryptography`` package (``pip install tariochbctools[tokencache]``). Each
+token is kept in its own file (0600, in a 0700 directory), encrypted and
+authenticated with Fernet under a key derived from the API secret it was
+requested with, so the files are useless without the importer's config. A file
+that can't be decrypted is ignored and a new token is requested.
+
+A token the api rejects (e.g. with a 401 as it was revoked) has to be
+invalidated, otherwise it would be used until it expires.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from os import environ, path
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+EXPIRY_MARGIN = 300
+
+
+def cacheDir() -> str | None:
+    directory = environ.get("TARIOCHBCTOOLS_TOKEN_CACHE") or None
+    if directory and Fernet is None:
+        logging.warning(
+            "Not caching access tokens, the token cache needs the cryptography package"
+        )
+        return None
+    return directory
+
+
+def cachedToken(name: str, secret: str, fetch: Callable[[], tuple[str, int]]) -> str:
+    """The cached token of name, or a new one from fetch, which returns the
+    token and the seconds it is valid for. Tokens expiring within
+    EXPIRY_MARGIN seconds aren't used anymore.
+    """
+    directory = cacheDir()
+    if not directory:
+        return fetch()[0]
+
+    tokenPath = _tokenPath(directory, name)
+    cached = _read(tokenPath, secret)
+    if cached and cached["expires"] - EXPIRY_MARGIN > time.time():
+        return cached["token"]
+
+    token, expiresIn = fetch()
+    _write(tokenPath, secret, {"token": token, "expires": time.time() + expiresIn})
+    return token
+
+
+def invalidate(name: str) -> None:
+    """Drop the cached token of name, so that the next one is fetched."""
+    directory = cacheDir()
+    if not directory:
+        return
+    try:
+        os.remove(_tokenPath(directory, name))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning("Could not invalidate access token: %s", e)
+
+
+class CachedToken:
+    """The cached token of name (see cachedToken), which can be renewed once
+    the api rejected it. Concurrent renewals of the same rejected token fetch
+    only one new token."""
+
+    def __init__(self, name: str, secret: str, fetch: Callable[[], tuple[str, int]]):
+        self.name = name
+        self.secret = secret
+        self.fetch = fetch
+        self.lock = threading.Lock()
+        self.token = cachedToken(name, secret, fetch)
+
+    def renew(self, rejected: str) -> str:
+        """A new token instead of the rejected one."""
+        with self.lock:
+            if self.token == rejected:
+                invalidate(self.name)
+                self.token = cachedToken(self.name, self.secret, self.fetch)
+            return self.token
+
+
+def _tokenPath(directory: str, name: str) -> str:
+    return path.join(directory, hashlib.sha256(name.encode()).hexdigest())
+
+
+def _fernet(secret: str) -> "Fernet":
+    key = hmac.digest(secret.encode(), b"tariochbctools token cache", "sha256")
+    return Fernet(base64.urlsafe_b64encode(key))
+
+
+def _read(tokenPath: str, secret: str) -> dict | None:
+    try:
+        with open(tokenPath, "rb") as f:
+            return json.loads(_fernet(secret).decrypt(f.read()))
+    except (OSError, ValueError, InvalidToken):
+        return None
+
+
+def _write(tokenPath: str, secret: str, cached: dict) -> None:
+    tmpPath = f"{tokenPath}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(path.dirname(tokenPath), mode=0o700, exist_ok=True)
+        fd = os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(_fernet(secret).encrypt(json.dumps(cached).encode()))
+        os.replace(tmpPath, tokenPath)
+    except OSError as e:
+        logging.warning("Could not cache access token: %s", e)
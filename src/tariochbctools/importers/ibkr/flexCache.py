@@ -0,0 +1,159 @@
+"""A shared on-disk cache of Flex statements.
+
+Requesting a Flex statement is a slow two step round trip, so the raw XML is
+kept per (token, query id) for a while and shared by the importer and the
+price source, e.g. a bean-price run over many tickers downloads it only once.
+The statement is streamed into the cache file and read back from it, so it is
+never held in memory as a whole unless a caller asks for its content.
+
+The cache directory and the time to live in seconds can be set with the
+environment variables ``TARIOCHBCTOOLS_FLEX_CACHE`` and
+``TARIOCHBCTOOLS_FLEX_CACHE_TTL``, a time to live of 0 disables the cache.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from os import environ, path
+from types import SimpleNamespace
+from typing import BinaryIO
+
+import requests
+from ibflex import client
+
+FLEX_URL = (
+    "https://ndcdyn.interactivebrokers.com/AccountManagement/FlexWebService/SendRequest"
+)
+DEFAULT_TTL = 600
+CHUNK_SIZE = 64 * 1024
+# The start of a response, enough to tell a statement from an error response
+HEAD_SIZE = 1024
+TIMEOUT = 60
+STATEMENT_TRIES = 5
+
+_locks: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+_locksLock = threading.Lock()
+
+
+def cacheDir() -> str:
+    if environ.get("TARIOCHBCTOOLS_FLEX_CACHE"):
+        return environ["TARIOCHBCTOOLS_FLEX_CACHE"]
+
+    cacheHome = environ.get("XDG_CACHE_HOME") or path.expanduser("~/.cache")
+    return path.join(cacheHome, "tariochbctools", "flex")
+
+
+def ttl() -> int:
+    return int(environ.get("TARIOCHBCTOOLS_FLEX_CACHE_TTL", DEFAULT_TTL))
+
+
+def requestStatement(token: str, queryId: str, f: BinaryIO) -> None:
+    """Download the statement from the flex web service into the file f,
+    without any caching. While the statement is being generated, the request
+    is retried like ibflex.client.download does.
+    """
+    stmt_access = client.request_statement(token, queryId, FLEX_URL)
+    for _ in range(STATEMENT_TRIES):
+        with requests.get(
+            stmt_access.Url,
+            params={"v": "3", "t": token, "q": stmt_access.ReferenceCode},
+            headers={"user-agent": "Java"},
+            stream=True,
+            timeout=TIMEOUT,
+        ) as response:
+            chunks = response.iter_content(CHUNK_SIZE)
+            head = b""
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= HEAD_SIZE:
+                    break
+
+            if b"FlexQueryResponse" in head:
+                f.write(head)
+                for chunk in chunks:
+                    f.write(chunk)
+                return
+
+            # An error response is small, so it can be checked as a whole
+            content = head + b"".join(chunks)
+        delay = client.check_statement_response(SimpleNamespace(content=content))
+        time.sleep(delay)
+
+    raise client.StatementGenerationTimeout(
+        "Exceeded max number of tries while attempting download"
+    )
+
+
+def openStatement(token: str, queryId: str) -> BinaryIO:
+    """The statement of the query as a binary file, downloaded only if there is
+    no fresh one cached.
+
+    Concurrent downloads of the same query within the process wait for the
+    first one instead of requesting the statement again.
+    """
+    maxAge = ttl()
+    if maxAge <= 0:
+        return _downloadUncached(token, queryId)
+
+    key = hashlib.sha256(f"{token}\0{queryId}".encode("utf-8")).hexdigest()
+    cachePath = path.join(cacheDir(), key + ".xml")
+    with _locksLock:
+        lock = _locks[key]
+
+    with lock:
+        f = _open(cachePath, maxAge)
+        if f is None:
+            f = _download(cachePath, token, queryId)
+
+    return f
+
+
+def download(token: str, queryId: str) -> bytes:
+    """The content of the statement of the query, see openStatement."""
+    with openStatement(token, queryId) as f:
+        return f.read()
+
+
+def _open(cachePath: str, maxAge: int) -> BinaryIO | None:
+    try:
+        if time.time() - os.stat(cachePath).st_mtime >= maxAge:
+            return None
+        return open(cachePath, "rb")
+    except OSError:
+        return None
+
+
+def _download(cachePath: str, token: str, queryId: str) -> BinaryIO:
+    tmpPath = f"{cachePath}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(path.dirname(cachePath), mode=0o700, exist_ok=True)
+        fd = os.open(tmpPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    except OSError as e:
+        logging.warning("Could not cache flex statement: %s", e)
+        return _downloadUncached(token, queryId)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            requestStatement(token, queryId, f)
+        os.replace(tmpPath, cachePath)
+    except BaseException:
+        if path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+    return open(cachePath, "rb")
+
+
+def _downloadUncached(token: str, queryId: str) -> BinaryIO:
+    f = tempfile.TemporaryFile()
+    try:
+        requestStatement(token, queryId, f)
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return f
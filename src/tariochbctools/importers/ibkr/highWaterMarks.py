@@ -0,0 +1,48 @@
+"""The date of the newest imported entry per account and kind of record, taken
+from the account meta of the existing entries, so that records imported by an
+earlier run can be skipped before any transaction is built for them. The marks
+only move once the entries have landed in the ledger.
+
+Trades and cash transactions have separate marks, as a cash transaction can be
+booked after later trades (e.g. a late dividend or a withholding correction).
+An entry with a posting held at cost is a trade, any other a cash transaction.
+
+A record is skipped if it is older than the mark of its account and kind.
+Records of the day of the mark are kept, as more of them could have been added
+since; deduplication drops the repeats.
+"""
+
+from datetime import date, datetime
+
+from beancount.core import data
+
+TRADES = "trades"
+CASH_TRANSACTIONS = "cashTransactions"
+
+
+def entryKind(entry: data.Transaction) -> str:
+    if any(posting.cost is not None for posting in entry.postings):
+        return TRADES
+    return CASH_TRANSACTIONS
+
+
+class HighWaterMarks:
+    def __init__(self, existing: data.Entries | None = None):
+        self.marks: dict[tuple[str, str], date] = {}
+        for entry in existing or []:
+            if not isinstance(entry, data.Transaction) or not entry.meta:
+                continue
+            account = entry.meta.get("account")
+            if not account:
+                continue
+            key = (account, entryKind(entry))
+            if key not in self.marks or self.marks[key] < entry.date:
+                self.marks[key] = entry.date
+
+    def isNew(self, account: str, kind: str, timestamp: date | None) -> bool:
+        mark = self.marks.get((account, kind))
+        if timestamp is None or mark is None:
+            return True
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.date()
+        return timestamp >= mark
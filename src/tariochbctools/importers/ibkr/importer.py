@@ -1,4 +1,6 @@
 import re
+import xml.etree.ElementTree as ET
+from collections.abc import Iterable, Iterator
 from datetime import date
 from decimal import Decimal
 from os import path
@@ -8,10 +10,65 @@ import beangulp
 import yaml
 from beancount.core import amount, data
 from beancount.core.number import D
-from ibflex import Types, client, parser
+from ibflex import Types, parser
 from ibflex.enums import CashAction
 
 from tariochbctools.importers.general.priceLookup import PriceLookup
+from tariochbctools.importers.ibkr import flexCache
+from tariochbctools.importers.ibkr.highWaterMarks import (
+    CASH_TRANSACTIONS,
+    TRADES,
+    HighWaterMarks,
+)
+
+PER_SHARE = re.compile(r".* (?P<perShare>\d+\.?\d+) PER SHARE")
+
+
+def cleanupSymbol(symbol: str) -> str:
+    result = symbol
+    result = result.rstrip("z")
+    result, _, _ = result.partition(".")
+
+    return result
+
+
+def perShare(description: str) -> str:
+    perShareGroups = PER_SHARE.search(description)
+    return perShareGroups.group("perShare") if perShareGroups else ""
+
+
+def iterFlexRecords(source: Any) -> Iterator[tuple[str, str, Any]]:
+    """Stream the records of the trades and cash transactions of a flex query
+    response as (account, container, record), with a ("FlexStatement", None)
+    record at the end of each account's statement.
+
+    Every element is dropped from the tree once it ended, so only the elements
+    on the path to the current one are kept in memory.
+    """
+    account = ""
+    parents: list[ET.Element] = []
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if not parents and elem.tag != "FlexQueryResponse":
+                raise parser.FlexParserError("Not a FlexQueryResponse")
+            if elem.tag == "FlexStatement":
+                account = elem.get("accountId", "")
+            parents.append(elem)
+            continue
+
+        parents.pop()
+        if not parents:
+            break
+
+        container = parents[-1].tag
+        if container in ("Trades", "CashTransactions"):
+            record = parser.parse_data_element(elem)
+            if record is not None:
+                yield account, container, record
+        elif elem.tag == "FlexStatement":
+            yield account, elem.tag, None
+
+        parents[-1].remove(elem)
 
 
 class Importer(beangulp.Importer):
@@ -23,36 +80,24 @@ class Importer(beangulp.Importer):
     def account(self, filepath: str) -> data.Account:
         return ""
 
-    def matches(
-        self, trx: Types.CashTransaction, t: Any, account: data.Account
-    ) -> bool:
-        p = re.compile(r".* (?P<perShare>\d+\.?\d+) PER SHARE")
-
-        trxPerShareGroups = p.search(trx.description)
-        tPerShareGroups = p.search(t["description"])
-
-        trxPerShare = trxPerShareGroups.group("perShare") if trxPerShareGroups else ""
-        tPerShare = tPerShareGroups.group("perShare") if tPerShareGroups else ""
-
+    def cashTransactionKey(
+        self, trx: Types.CashTransaction, account: data.Account
+    ) -> tuple:
         return (
-            t["date"] == trx.dateTime
-            and t["symbol"] == self.cleanupSymbol(trx.symbol)
-            and trxPerShare == tPerShare
-            and t["account"] == account
+            trx.dateTime,
+            cleanupSymbol(trx.symbol),
+            perShare(trx.description),
+            account,
         )
 
+    def aggregateKey(self, t: Any) -> tuple:
+        return (t["date"], t["symbol"], perShare(t["description"]), t["account"])
+
     def download(self, token, queryId):
-        stmt_access = client.request_statement(
-            token,
-            queryId,
-            "https://ndcdyn.interactivebrokers.com/AccountManagement/FlexWebService/SendRequest",
-        )
-        response = client.submit_request(
-            url=stmt_access.Url, token=token, query=stmt_access.ReferenceCode
-        )
-        client.check_statement_response(response)
+        return flexCache.download(token, queryId)
 
-        return response.content
+    def openStatement(self, token, queryId):
+        return flexCache.openStatement(token, queryId)
 
     def extract(self, filepath: str, existing: data.Entries) -> data.Entries:
         with open(filepath, "r") as f:
@@ -61,98 +106,166 @@ class Importer(beangulp.Importer):
         queryId = config["queryId"]
 
         priceLookup = PriceLookup(existing, config["baseCcy"])
+        marks = HighWaterMarks(existing if config.get("skipImported") else None)
 
-        response = self.download(token, queryId)
+        if config.get("streaming"):
+            with self.openStatement(token, queryId) as source:
+                return list(
+                    self.extractStreaming(source, config["baseCcy"], priceLookup, marks)
+                )
 
+        response = self.download(token, queryId)
         statement = parser.parse(response)
         assert isinstance(statement, Types.FlexQueryResponse)
 
         result = []
         for stmt in statement.FlexStatements:
-            transactions: list = []
             account = stmt.accountId
             for trx in stmt.Trades:
+                if marks.isNew(account, TRADES, trx.tradeDate):
+                    result.append(self.createTradeBuy(trx, account, config["baseCcy"]))
+
+            transactions = self.aggregateCashTransactions(
+                (
+                    trx
+                    for trx in stmt.CashTransactions
+                    if marks.isNew(account, CASH_TRANSACTIONS, trx.dateTime)
+                ),
+                account,
+            )
+            result.extend(self.createDividends(transactions, priceLookup))
+
+        return result
+
+    def extractStreaming(
+        self,
+        source: Any,
+        baseCcy: str,
+        priceLookup: PriceLookup,
+        marks: HighWaterMarks | None = None,
+    ) -> Iterator[data.Transaction]:
+        """Like extract, but walks the trades and cash transactions of the flex
+        statement in source (a file name or object) one at a time instead of
+        parsing the whole statement into memory.
+
+        The buys are yielded right away, the dividends at the end of each
+        account's statement, as withholding taxes can come after the dividend.
+        """
+        marks = marks or HighWaterMarks()
+        transactions: list = []
+        index: dict = {}
+        for account, container, record in iterFlexRecords(source):
+            if container == "Trades":
+                if marks.isNew(account, TRADES, record.tradeDate):
+                    yield self.createTradeBuy(record, account, baseCcy)
+            elif container == "CashTransactions":
+                if marks.isNew(account, CASH_TRANSACTIONS, record.dateTime):
+                    self.addCashTransaction(record, account, transactions, index)
+            else:
+                yield from self.createDividends(transactions, priceLookup)
+                transactions = []
+                index = {}
+
+    def createTradeBuy(
+        self, trx: Types.Trade, account: data.Account, baseCcy: str
+    ) -> data.Transaction:
+        return self.createBuy(
+            trx.tradeDate,
+            account,
+            cleanupSymbol(trx.symbol),
+            trx.quantity,
+            trx.currency,
+            trx.tradePrice,
+            amount.Amount(round(-trx.ibCommission, 2), trx.ibCommissionCurrency),
+            amount.Amount(round(trx.netCash, 2), trx.currency),
+            baseCcy,
+            trx.fxRateToBase,
+        )
+
+    def createDividends(
+        self, transactions: list, priceLookup: PriceLookup
+    ) -> list[data.Transaction]:
+        result = []
+        for trx in transactions:
+            if trx["type"] == CashAction.DIVIDEND:
+                asset = trx["symbol"]
+                payDate = trx["date"].date()
+                totalDividend = trx["amount"]
+                totalWithholding = -trx["whAmount"]
+                totalPayout = totalDividend - totalWithholding
+                currency = trx["currency"]
+                account = trx["account"]
+
                 result.append(
-                    self.createBuy(
-                        trx.tradeDate,
+                    self.createDividen(
+                        totalPayout,
+                        totalWithholding,
+                        asset,
+                        currency,
+                        payDate,
+                        priceLookup,
+                        trx["description"],
                         account,
-                        self.cleanupSymbol(trx.symbol),
-                        trx.quantity,
-                        trx.currency,
-                        trx.tradePrice,
-                        amount.Amount(
-                            round(-trx.ibCommission, 2), trx.ibCommissionCurrency
-                        ),
-                        amount.Amount(round(trx.netCash, 2), trx.currency),
-                        config["baseCcy"],
-                        trx.fxRateToBase,
                     )
                 )
 
-            for trx in stmt.CashTransactions:
-                existingEntry = None
-                if CashAction.DIVIDEND == trx.type or CashAction.WHTAX == trx.type:
-                    existingEntry = next(
-                        (
-                            t
-                            for t in transactions
-                            if self.matches(trx, t, stmt.accountId)
-                        ),
-                        None,
-                    )
+        return result
 
-                if existingEntry:
-                    if CashAction.WHTAX == trx.type:
-                        existingEntry["whAmount"] += trx.amount
-                    else:
-                        existingEntry["amount"] += trx.amount
-                        existingEntry["description"] = trx.description
-                        existingEntry["type"] = trx.type
-                else:
-                    if CashAction.WHTAX == trx.type:
-                        amt = 0
-                        whAmount = trx.amount
-                    else:
-                        amt = trx.amount
-                        whAmount = 0
-
-                    transactions.append(
-                        {
-                            "date": trx.dateTime,
-                            "symbol": self.cleanupSymbol(trx.symbol),
-                            "currency": trx.currency,
-                            "amount": amt,
-                            "whAmount": whAmount,
-                            "description": trx.description,
-                            "type": trx.type,
-                            "account": account,
-                        }
-                    )
+    def aggregateCashTransactions(
+        self, cashTransactions: Iterable, account: data.Account
+    ) -> list:
+        """Sum up the withholding taxes and dividends paid at the same time for
+        the same symbol and amount per share.
 
-            for trx in transactions:
-                if trx["type"] == CashAction.DIVIDEND:
-                    asset = trx["symbol"]
-                    payDate = trx["date"].date()
-                    totalDividend = trx["amount"]
-                    totalWithholding = -trx["whAmount"]
-                    totalPayout = totalDividend - totalWithholding
-                    currency = trx["currency"]
-                    account = trx["account"]
-
-                    result.append(
-                        self.createDividen(
-                            totalPayout,
-                            totalWithholding,
-                            asset,
-                            currency,
-                            payDate,
-                            priceLookup,
-                            trx["description"],
-                            account,
-                        )
-                    )
+        The aggregates are looked up by that key instead of comparing against
+        every earlier aggregate, as there can be thousands of them.
+        """
+        transactions: list = []
+        index: dict = {}
+        for trx in cashTransactions:
+            self.addCashTransaction(trx, account, transactions, index)
 
-        return result
+        return transactions
+
+    def addCashTransaction(
+        self,
+        trx: Types.CashTransaction,
+        account: data.Account,
+        transactions: list,
+        index: dict,
+    ) -> None:
+        existingEntry = None
+        if CashAction.DIVIDEND == trx.type or CashAction.WHTAX == trx.type:
+            existingEntry = index.get(self.cashTransactionKey(trx, account))
+
+        if existingEntry:
+            if CashAction.WHTAX == trx.type:
+                existingEntry["whAmount"] += trx.amount
+            else:
+                existingEntry["amount"] += trx.amount
+                existingEntry["description"] = trx.description
+                existingEntry["type"] = trx.type
+        else:
+            if CashAction.WHTAX == trx.type:
+                amt = 0
+                whAmount = trx.amount
+            else:
+                amt = trx.amount
+                whAmount = 0
+
+            transactions.append(
+                {
+                    "date": trx.dateTime,
+                    "symbol": cleanupSymbol(trx.symbol),
+                    "currency": trx.currency,
+                    "amount": amt,
+                    "whAmount": whAmount,
+                    "description": trx.description,
+                    "type": trx.type,
+                    "account": account,
+                }
+            )
+            index.setdefault(self.aggregateKey(transactions[-1]), transactions[-1])
 
     def createDividen(
         self,
@@ -269,10 +382,3 @@ class Importer(beangulp.Importer):
 
     def getFeeAccount(self, account: str) -> data.Account:
         return f"Expenses:{account}:Fees"
-
-    def cleanupSymbol(self, symbol: str) -> str:
-        result = symbol
-        result = result.rstrip("z")
-        result, _, _ = result.partition(".")
-
-        return result
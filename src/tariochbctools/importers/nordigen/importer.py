@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from os import path
 
@@ -7,8 +8,15 @@ import yaml
 from beancount.core import amount, data
 from beancount.core.number import D
 
+from tariochbctools.importers.general import httpClient, jsonStream, tokenCache
 from tariochbctools.importers.general.deduplication import ReferenceDuplicatesComparator
 
+API_HOST = "bankaccountdata.gocardless.com"
+
+DEFAULT_CONCURRENCY = 4
+
+CHUNK_SIZE = 64 * 1024
+
 
 class HttpServiceException(Exception):
     pass
@@ -27,8 +35,76 @@ class Importer(beangulp.Importer):
         with open(filepath, "r") as f:
             config = yaml.safe_load(f)
 
-        r = requests.post(
-            "https://bankaccountdata.gocardless.com/api/v2/token/new/",
+        client = httpClient.sharedClient()
+        token = tokenCache.CachedToken(
+            f"nordigen/{config['secret_id']}",
+            config["secret_key"],
+            lambda: self._fetchToken(client, config),
+        )
+
+        # The accounts are fetched concurrently with the same token. A 429
+        # pauses all requests to the api (see httpClient).
+        concurrency = config.get("concurrency", DEFAULT_CONCURRENCY)
+        client.setHostLimit(API_HOST, concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            accountsEntries = executor.map(
+                lambda account: self._fetchEntries(client, account, token),
+                config["accounts"],
+            )
+            return [entry for entries in accountsEntries for entry in entries]
+
+    def _createEntry(self, trx: dict, assetAccount: str) -> data.Transaction:
+        if "transactionId" in trx:
+            metakv = {
+                "nordref": trx["transactionId"],
+            }
+        else:
+            metakv = {}
+
+        if "creditorName" in trx:
+            metakv["creditorName"] = trx["creditorName"]
+        if "debtorName" in trx:
+            metakv["debtorName"] = trx["debtorName"]
+        if "currencyExchange" in trx:
+            instructedAmount = trx["currencyExchange"]["instructedAmount"]
+            metakv["original"] = (
+                instructedAmount["currency"] + " " + instructedAmount["amount"]
+            )
+        meta = data.new_metadata("", 0, metakv)
+        trxDate = date.fromisoformat(trx["bookingDate"])
+        narration = ""
+        if "remittanceInformationUnstructured" in trx:
+            narration += trx["remittanceInformationUnstructured"]
+        if "remittanceInformationUnstructuredArray" in trx:
+            narration += " ".join(trx["remittanceInformationUnstructuredArray"])
+        return data.Transaction(
+            meta,
+            trxDate,
+            "*",
+            "",
+            narration,
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                data.Posting(
+                    assetAccount,
+                    amount.Amount(
+                        D(str(trx["transactionAmount"]["amount"])),
+                        trx["transactionAmount"]["currency"],
+                    ),
+                    None,
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        )
+
+    def _fetchToken(
+        self, client: httpClient.HttpClient, config: dict
+    ) -> tuple[str, int]:
+        r = client.post(
+            f"https://{API_HOST}/api/v2/token/new/",
             data={
                 "secret_id": config["secret_id"],
                 "secret_key": config["secret_key"],
@@ -39,73 +115,51 @@ class Importer(beangulp.Importer):
         except requests.exceptions.HTTPError as e:
             raise HttpServiceException(e, e.response.text)
 
-        token = r.json()["access"]
-        headers = {"Authorization": "Bearer " + token}
+        return r.json()["access"], r.json()["access_expires"]
 
-        entries = []
-        for account in config["accounts"]:
-            accountId = account["id"]
-            assetAccount = account["asset_account"]
-            r = requests.get(
-                f"https://bankaccountdata.gocardless.com/api/v2/accounts/{accountId}/transactions/",
-                headers=headers,
-            )
+    def _getTransactions(
+        self, client: httpClient.HttpClient, account: dict, accessToken: str
+    ) -> requests.Response:
+        return client.get(
+            f"https://{API_HOST}/api/v2/accounts/{account['id']}/transactions/",
+            headers={"Authorization": "Bearer " + accessToken},
+            stream=True,
+        )
+
+    def _fetchEntries(
+        self,
+        client: httpClient.HttpClient,
+        account: dict,
+        token: tokenCache.CachedToken,
+    ) -> data.Entries:
+        """The entries of the booked transactions of account, sorted by booking
+        date. The response is decoded while it is received, one transaction at
+        a time, so only the entries and their sort keys are kept in memory.
+
+        If the token is rejected, the request is retried once with a new one.
+        """
+        accessToken = token.token
+        r = self._getTransactions(client, account, accessToken)
+        if r.status_code == 401:
+            r.close()
+            r = self._getTransactions(client, account, token.renew(accessToken))
+        with r:
             try:
                 r.raise_for_status()
             except requests.exceptions.HTTPError as e:
                 raise HttpServiceException(e, e.response.text)
 
-            transactions = sorted(
-                r.json()["transactions"]["booked"], key=lambda trx: trx["bookingDate"]
-            )
-            for trx in transactions:
-                if "transactionId" in trx:
-                    metakv = {
-                        "nordref": trx["transactionId"],
-                    }
-                else:
-                    metakv = {}
-
-                if "creditorName" in trx:
-                    metakv["creditorName"] = trx["creditorName"]
-                if "debtorName" in trx:
-                    metakv["debtorName"] = trx["debtorName"]
-                if "currencyExchange" in trx:
-                    instructedAmount = trx["currencyExchange"]["instructedAmount"]
-                    metakv["original"] = (
-                        instructedAmount["currency"] + " " + instructedAmount["amount"]
-                    )
-                meta = data.new_metadata("", 0, metakv)
-                trxDate = date.fromisoformat(trx["bookingDate"])
-                narration = ""
-                if "remittanceInformationUnstructured" in trx:
-                    narration += trx["remittanceInformationUnstructured"]
-                if "remittanceInformationUnstructuredArray" in trx:
-                    narration += " ".join(trx["remittanceInformationUnstructuredArray"])
-                entry = data.Transaction(
-                    meta,
-                    trxDate,
-                    "*",
-                    "",
-                    narration,
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [
-                        data.Posting(
-                            assetAccount,
-                            amount.Amount(
-                                D(str(trx["transactionAmount"]["amount"])),
-                                trx["transactionAmount"]["currency"],
-                            ),
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ],
-                )
-                entries.append(entry)
-
-        return entries
+            keys = []
+            entries = []
+            for trx in jsonStream.iterItems(
+                r.iter_content(CHUNK_SIZE), ("transactions", "booked")
+            ):
+                keys.append((trx["bookingDate"], len(entries)))
+                entries.append(self._createEntry(trx, account["asset_account"]))
+
+        return [entries[index] for _, index in sorted(keys)]
 
     cmp = ReferenceDuplicatesComparator(["nordref"])
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
@@ -5,20 +5,40 @@ from typing import Any
 
 import requests
 
+from tariochbctools.importers.general import httpClient, tokenCache
+
 
 def build_header(token: str) -> dict[str, str]:
     return {"Authorization": "Bearer " + token}
 
 
+class UnauthorizedError(Exception):
+    pass
+
+
 def check_result(result: requests.Response) -> None:
     try:
         result.raise_for_status()
     except requests.exceptions.HTTPError as e:
+        if e.response.status_code == 401:
+            raise UnauthorizedError(e, e.response.text)
         raise Exception(e, e.response.text)
 
 
+def _token_name(secret_id: str) -> str:
+    return f"nordigen/{secret_id}"
+
+
 def get_token(secret_id: str, secret_key: str) -> str:
-    r = requests.post(
+    return tokenCache.cachedToken(
+        _token_name(secret_id),
+        secret_key,
+        lambda: _request_token(secret_id, secret_key),
+    )
+
+
+def _request_token(secret_id: str, secret_key: str) -> tuple[str, int]:
+    r = httpClient.sharedClient().post(
         "https://bankaccountdata.gocardless.com/api/v2/token/new/",
         data={
             "secret_id": secret_id,
@@ -27,11 +47,11 @@ def get_token(secret_id: str, secret_key: str) -> str:
     )
     check_result(r)
 
-    return r.json()["access"]
+    return r.json()["access"], r.json()["access_expires"]
 
 
 def list_bank(token: str, country: str) -> None:
-    r = requests.get(
+    r = httpClient.sharedClient().get(
         "https://bankaccountdata.gocardless.com/api/v2/institutions/",
         params={"country": country},
         headers=build_header(token),
@@ -57,7 +77,7 @@ def create_link(
         print(f"Link for for reference {reference} already exists.")  # noqa: T201
     else:
         decoder = JSONDecoder()
-        r1 = requests.post(
+        r1 = httpClient.sharedClient().post(
             "https://bankaccountdata.gocardless.com/api/v2/agreements/enduser/",
             data={
                 "institution_id": bank,
@@ -69,7 +89,7 @@ def create_link(
         )
         check_result(r1)
         agreement_id = r1.json()["id"]
-        r2 = requests.post(
+        r2 = httpClient.sharedClient().post(
             "https://bankaccountdata.gocardless.com/api/v2/requisitions/",
             data={
                 "redirect": "http://localhost",
@@ -86,7 +106,7 @@ def create_link(
 
 def list_accounts(token: str) -> None:
     headers = build_header(token)
-    r = requests.get(
+    r = httpClient.sharedClient().get(
         "https://bankaccountdata.gocardless.com/api/v2/requisitions/", headers=headers
     )
     print(r.json())  # noqa: T201
@@ -95,7 +115,7 @@ def list_accounts(token: str) -> None:
         reference = req["reference"]
         print(f"Reference: {reference}")  # noqa: T201
         for account in req["accounts"]:
-            ra = requests.get(
+            ra = httpClient.sharedClient().get(
                 f"https://bankaccountdata.gocardless.com/api/v2/accounts/{account}",
                 headers=headers,
             )
@@ -104,7 +124,7 @@ def list_accounts(token: str) -> None:
             asp = acc["institution_id"]
             iban = acc["iban"]
 
-            ra = requests.get(
+            ra = httpClient.sharedClient().get(
                 f"https://bankaccountdata.gocardless.com/api/v2/accounts/{account}/details",
                 headers=headers,
             )
@@ -119,7 +139,7 @@ def list_accounts(token: str) -> None:
 def delete_link(token: str, reference: str) -> None:
     requisitionId = _find_requisition_id(token, reference)
     if requisitionId:
-        r = requests.delete(
+        r = httpClient.sharedClient().delete(
             f"https://bankaccountdata.gocardless.com/api/v2/requisitions/{requisitionId}",
             headers=build_header(token),
         )
@@ -128,7 +148,7 @@ def delete_link(token: str, reference: str) -> None:
 
 def _find_requisition_id(token: str, userId: str) -> str | None:
     headers = build_header(token)
-    r = requests.get(
+    r = httpClient.sharedClient().get(
         "https://bankaccountdata.gocardless.com/api/v2/requisitions/", headers=headers
     )
     check_result(r)
@@ -195,8 +215,15 @@ def parse_args(args: Any) -> Any:
 def main(args: Any) -> None:
     args = parse_args(args)
 
-    token = get_token(args.secret_id, args.secret_key)
+    try:
+        run_mode(args, get_token(args.secret_id, args.secret_key))
+    except UnauthorizedError:
+        # The cached token was rejected (e.g. revoked), retry with a new one
+        tokenCache.invalidate(_token_name(args.secret_id))
+        run_mode(args, get_token(args.secret_id, args.secret_key))
+
 
+def run_mode(args: Any, token: str) -> None:
     if args.mode == "list_banks":
         list_bank(token, args.country)
     elif args.mode == "create_link":
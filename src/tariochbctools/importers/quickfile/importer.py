@@ -1,9 +1,10 @@
 import logging
 import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor
 from datetime import datetime
 from hashlib import md5
 from os import path
-from typing import Dict, List, NamedTuple
+from typing import Dict, List, NamedTuple, Optional
 
 import beangulp
 import requests
@@ -12,6 +13,10 @@ from beancount.core import amount, data
 from beancount.core.number import D
 from undictify import type_checked_constructor
 
+from tariochbctools.importers.general import httpClient
+
+DEFAULT_CONCURRENCY = 4
+
 
 @type_checked_constructor(skip=True, convert=True)
 class QuickFileTransaction(NamedTuple):
@@ -80,12 +85,12 @@ class QuickFile:
 
     DOMAIN = "quickfile.co.uk"
     API_VERSION_SLUG = "1_2"
+    PAGE_SIZE = 200  # the maximum ReturnCount of a bank search
 
     def __init__(self, account_number, api_key, app_id):
         self.account_number = account_number
         self.api_key = api_key
         self.app_id = app_id
-        self._update_submission_number()
 
     @staticmethod
     def auth_md5(account_number, api_key, submission_number):
@@ -93,14 +98,12 @@ class QuickFile:
 
         return md5(md5_str).hexdigest()
 
-    def request_header(self):
-        auth_md5 = self.auth_md5(
-            self.account_number, self.api_key, self.submission_number
-        )
+    def request_header(self, submission_number):
+        auth_md5 = self.auth_md5(self.account_number, self.api_key, submission_number)
 
         header = {
             "MessageType": "Request",
-            "SubmissionNumber": str(self.submission_number),
+            "SubmissionNumber": str(submission_number),
             "Authentication": {
                 "AccNumber": str(self.account_number),
                 "MD5Value": auth_md5,
@@ -109,14 +112,13 @@ class QuickFile:
         }
         return header
 
-    def _update_submission_number(self):
-        self.submission_number = uuid.uuid4()
-
     def _post(self, endpoint, endpoint_data):
-        header = self.request_header()
+        # every request needs a new submission number, also when sent
+        # concurrently
+        header = self.request_header(uuid.uuid4())
         post_data = {"payload": {"Header": header, "Body": endpoint_data}}
 
-        r = requests.post(
+        r = httpClient.sharedClient().post(
             f"https://api.{self.DOMAIN}/{self.API_VERSION_SLUG}/{endpoint}",
             json=post_data,
         )
@@ -127,17 +129,15 @@ class QuickFile:
             except requests.HTTPError as e:
                 logging.warning(e)
 
-        self._update_submission_number()
-
         return r.json()
 
     def bank_search(
-        self, account_number, transaction_count, from_date=None, to_date=None
+        self, account_number, transaction_count, from_date=None, to_date=None, offset=0
     ):
         endpoint_data = {
             "SearchParameters": {
                 "ReturnCount": str(transaction_count),
-                "Offset": "0",
+                "Offset": str(offset),
                 "OrderResultsBy": "TransactionDate",
                 "OrderDirection": "DESC",
                 "NominalCode": str(account_number),
@@ -151,6 +151,52 @@ class QuickFile:
         body = response["Bank_Search"]["Body"]
         return QuickFileBankSearch(**body)
 
+    def bank_search_all(
+        self,
+        account_number,
+        transaction_count=None,
+        from_date=None,
+        to_date=None,
+        executor: Optional[Executor] = None,
+    ):
+        """Search the latest transaction_count transactions, or all if None,
+        in pages of PAGE_SIZE. After the first page has told the number of
+        transactions, the other pages are fetched with executor (if given).
+        """
+        page_size = self.PAGE_SIZE
+        if transaction_count is not None:
+            page_size = min(page_size, int(transaction_count))
+        first_page = self.bank_search(account_number, page_size, from_date, to_date)
+
+        total = first_page.MetaData.RecordsetCount
+        if transaction_count is not None:
+            total = min(total, int(transaction_count))
+
+        def search(offset):
+            return self.bank_search(
+                account_number,
+                min(self.PAGE_SIZE, total - offset),
+                from_date,
+                to_date,
+                offset,
+            )
+
+        offsets = range(page_size, total, self.PAGE_SIZE)
+        pages = executor.map(search, offsets) if executor else map(search, offsets)
+
+        # transactions added while paging shift the later pages
+        transactions = []
+        seen = set()
+        for page in [first_page, *pages]:
+            for trx in page.Transactions["Transaction"]:
+                if trx.TransactionId not in seen:
+                    seen.add(trx.TransactionId)
+                    transactions.append(trx)
+
+        return QuickFileBankSearch(
+            MetaData=first_page.MetaData, Transactions={"Transaction": transactions}
+        )
+
 
 class Importer(beangulp.Importer):
     """An importer for QuickFile"""
@@ -159,6 +205,7 @@ class Importer(beangulp.Importer):
         self.quickfile = None
         self.config = None
         self.existing = None
+        self.executor = None
 
     def _configure(self, filepath, existing):
         with open(filepath, "r") as config_file:
@@ -180,18 +227,30 @@ class Importer(beangulp.Importer):
         self._configure(filepath, existing)
         entries = []
 
-        for bank_account in self.config["accounts"].keys():
-            entries.extend(self._extract_bank_transactions(bank_account))
+        # The accounts are extracted concurrently, their pages are fetched on
+        # a separate pool, so that an account never waits for a page queued
+        # behind other accounts.
+        concurrency = self.config.get("concurrency", DEFAULT_CONCURRENCY)
+        httpClient.sharedClient().setHostLimit(f"api.{QuickFile.DOMAIN}", concurrency)
+        with (
+            ThreadPoolExecutor(max_workers=concurrency) as account_executor,
+            ThreadPoolExecutor(max_workers=concurrency) as page_executor,
+        ):
+            self.executor = page_executor
+            for account_entries in account_executor.map(
+                self._extract_bank_transactions, self.config["accounts"].keys()
+            ):
+                entries.extend(account_entries)
 
         return entries
 
     def _extract_bank_transactions(self, bank_account, invert_sign=False):
         entries = []
-        transaction_count = self.config["transaction_count"]  # [0..200]
+        transaction_count = self.config.get("transaction_count", None)
         from_date = self.config.get("from_date", None)
         to_date = self.config.get("to_date", None)
-        response = self.quickfile.bank_search(
-            bank_account, transaction_count, from_date, to_date
+        response = self.quickfile.bank_search_all(
+            bank_account, transaction_count, from_date, to_date, self.executor
         )
         metadata = response.MetaData
         transactions = response.Transactions["Transaction"]
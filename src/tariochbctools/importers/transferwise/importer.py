@@ -1,23 +1,30 @@
 import base64
 import json
-from datetime import date, datetime, timezone
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from os import path
 from typing import Any
 from urllib.parse import urlencode
 
 import beangulp
 import dateutil.parser
-import requests
 import rsa
-import urllib3
 import yaml
 from beancount.core import amount, data
 from beancount.core.number import D
 from dateutil.relativedelta import relativedelta
 
+from tariochbctools.importers.general import httpClient
 from tariochbctools.importers.general.deduplication import ReferenceDuplicatesComparator
 
-http = urllib3.PoolManager()
+DEFAULT_CONCURRENCY = 4
+
+MAX_SCA_ATTEMPTS = 3
+
+# The longest interval a statement can be requested for
+MAX_STATEMENT_DAYS = 469
 
 
 class Importer(beangulp.Importer):
@@ -46,6 +53,11 @@ class Importer(beangulp.Importer):
             self.endDate = datetime.combine(
                 date.today(), datetime.max.time(), timezone.utc
             ).isoformat()
+        self.one_time_token = None
+        self.signature = None
+        self.private_key_path = None
+        self.private_key = None
+        self.sca_lock = threading.Lock()
         super().__init__(*args, **kwargs)
 
     # Based on the Transferwise official example provided under the
@@ -55,13 +67,15 @@ class Importer(beangulp.Importer):
         currency: str,
         base_url: str,
         statement_type: str = "FLAT",
+        interval: tuple[str, str] | None = None,
     ) -> Any:
+        intervalStart, intervalEnd = interval or (self.startDate, self.endDate)
         params = urlencode(
             {
                 "currency": currency,
                 "type": statement_type,
-                "intervalStart": self.startDate,
-                "intervalEnd": self.endDate,
+                "intervalStart": intervalStart,
+                "intervalEnd": intervalEnd,
             }
         )
 
@@ -75,41 +89,50 @@ class Importer(beangulp.Importer):
             + params
         )
 
-        headers = {
-            "Authorization": "Bearer " + self.api_token,
-            "User-Agent": "tw-statements-sca",
-            "Content-Type": "application/json",
-        }
-        if hasattr(self, "one_time_token"):
-            headers["x-2fa-approval"] = self.one_time_token  # type: ignore
-            headers["X-Signature"] = self.signature  # type: ignore
-
-        r = http.request("GET", url, headers=headers, retries=False)
-
-        if r.status == 200 or r.status == 201:
-            return json.loads(r.data)
-        elif r.status == 403 and r.getheader("x-2fa-approval") is not None:
-            self.one_time_token = r.getheader("x-2fa-approval")
-            self.signature = self._do_sca_challenge()
-            return self._get_statement(
-                currency=currency,
-                base_url=base_url,
-                statement_type=statement_type,
-            )
-        else:
-            raise Exception("Failed to get transactions.")
+        for _ in range(MAX_SCA_ATTEMPTS):
+            with self.sca_lock:
+                one_time_token, signature = self.one_time_token, self.signature
 
-    def _do_sca_challenge(self):
-        # Read the private key file as bytes.
-        with open(self.private_key_path, "rb") as f:
-            private_key_data = f.read()
+            headers = {
+                "Authorization": "Bearer " + self.api_token,
+                "User-Agent": "tw-statements-sca",
+                "Content-Type": "application/json",
+            }
+            if one_time_token:
+                headers["x-2fa-approval"] = one_time_token
+                headers["X-Signature"] = signature
+
+            r = httpClient.sharedClient().get(url, headers=headers)
+
+            if r.status_code == 200 or r.status_code == 201:
+                return r.json()
+            elif r.status_code == 403 and r.headers.get("x-2fa-approval") is not None:
+                # The statements are fetched concurrently, only the first one
+                # to get here solves the challenge, the others retry with it.
+                with self.sca_lock:
+                    if self.one_time_token == one_time_token:
+                        self.one_time_token = r.headers["x-2fa-approval"]
+                        self.signature = self._do_sca_challenge()
+            else:
+                break
 
-        private_key = rsa.PrivateKey.load_pkcs1(private_key_data, "PEM")
+        raise Exception("Failed to get transactions.")
 
+    def _get_private_key(self) -> rsa.PrivateKey:
+        if self.private_key is None:
+            # Read the private key file as bytes.
+            with open(self.private_key_path, "rb") as f:
+                private_key_data = f.read()
+
+            self.private_key = rsa.PrivateKey.load_pkcs1(private_key_data, "PEM")
+
+        return self.private_key
+
+    def _do_sca_challenge(self):
         # Use the private key to sign the one-time-token that was returned
         # in the x-2fa-approval header of the HTTP 403.
         signed_token = rsa.sign(
-            self.one_time_token.encode("ascii"), private_key, "SHA-256"
+            self.one_time_token.encode("ascii"), self._get_private_key(), "SHA-256"
         )
 
         # Encode the signed message as friendly base64 format for HTTP
@@ -123,17 +146,18 @@ class Importer(beangulp.Importer):
             config = yaml.safe_load(f)
         self.api_token = config["token"]
         baseAccount = config["baseAccount"]
-        self.private_key_path = config["privateKeyPath"]
+        if self.private_key_path != config["privateKeyPath"]:
+            self.private_key_path = config["privateKeyPath"]
+            self.private_key = None
 
         headers = {"Authorization": "Bearer " + self.api_token}
+        client = httpClient.sharedClient()
         if not self.profileId:
-            r = requests.get(
-                "https://api.transferwise.com/v1/profiles", headers=headers
-            )
+            r = client.get("https://api.transferwise.com/v1/profiles", headers=headers)
             profiles = r.json()
             self.profileId = profiles[0]["id"]
 
-        r = requests.get(
+        r = client.get(
             "https://api.transferwise.com/v1/borderless-accounts",
             params={"profileId": self.profileId},
             headers=headers,
@@ -141,49 +165,167 @@ class Importer(beangulp.Importer):
         accounts = r.json()
         self.accountId = accounts[0]["id"]
 
-        entries = []
         base_url = "https://api.transferwise.com"
-        for account in accounts[0]["balances"]:
-            accountCcy = account["currency"]
-            if isinstance(baseAccount, dict):
-                account_name = baseAccount[accountCcy]
+        balances = accounts[0]["balances"]
+        concurrency = config.get("concurrency", DEFAULT_CONCURRENCY)
+        client.setHostLimit("api.transferwise.com", concurrency)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if "backfill" in config:
+                checkpointDir = config["backfill"].get("checkpointDir")
+                if checkpointDir:
+                    checkpointDir = path.join(path.dirname(filepath), checkpointDir)
+                statements = self._backfill_statements(
+                    executor,
+                    base_url,
+                    [account["currency"] for account in balances],
+                    config["backfill"]["startDate"],
+                    checkpointDir,
+                )
             else:
-                account_name = baseAccount + accountCcy
-            transactions = self._get_statement(
-                currency=accountCcy,
-                base_url=base_url,
-                statement_type="FLAT",
-            )
-
-            for transaction in transactions["transactions"]:
-                metakv = {
-                    "ref": transaction["referenceNumber"],
-                }
-                meta = data.new_metadata("", 0, metakv)
-                entry = data.Transaction(
-                    meta,
-                    dateutil.parser.parse(transaction["date"]).date(),
-                    "*",
-                    "",
-                    transaction["details"]["description"],
-                    data.EMPTY_SET,
-                    data.EMPTY_SET,
-                    [
-                        data.Posting(
-                            account_name,
-                            amount.Amount(
-                                D(str(transaction["amount"]["value"])),
-                                transaction["amount"]["currency"],
-                            ),
-                            None,
-                            None,
-                            None,
-                            None,
-                        ),
-                    ],
+                statements = executor.map(
+                    lambda account: self._get_statement(
+                        currency=account["currency"],
+                        base_url=base_url,
+                        statement_type="FLAT",
+                    )["transactions"],
+                    balances,
                 )
-                entries.append(entry)
+
+            entries = []
+            for account, transactions in zip(balances, statements):
+                accountCcy = account["currency"]
+                if isinstance(baseAccount, dict):
+                    account_name = baseAccount[accountCcy]
+                else:
+                    account_name = baseAccount + accountCcy
+
+                for transaction in transactions:
+                    entries.append(self._create_entry(transaction, account_name))
 
         return entries
 
+    def _create_entry(
+        self, transaction: dict[str, Any], account_name: str
+    ) -> data.Transaction:
+        metakv = {
+            "ref": transaction["referenceNumber"],
+        }
+        meta = data.new_metadata("", 0, metakv)
+        return data.Transaction(
+            meta,
+            dateutil.parser.parse(transaction["date"]).date(),
+            "*",
+            "",
+            transaction["details"]["description"],
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [
+                data.Posting(
+                    account_name,
+                    amount.Amount(
+                        D(str(transaction["amount"]["value"])),
+                        transaction["amount"]["currency"],
+                    ),
+                    None,
+                    None,
+                    None,
+                    None,
+                ),
+            ],
+        )
+
+    def _statement_windows(self, startDate: date) -> list[tuple[datetime, datetime]]:
+        """Split the time from startDate to endDate into windows of at most
+        MAX_STATEMENT_DAYS. A window ends where the next one starts."""
+        if isinstance(startDate, str):
+            startDate = date.fromisoformat(startDate)
+        start = datetime.combine(startDate, datetime.min.time(), timezone.utc)
+        end = dateutil.parser.parse(self.endDate)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        windows = []
+        while start < end:
+            windowEnd = min(start + timedelta(days=MAX_STATEMENT_DAYS), end)
+            windows.append((start, windowEnd))
+            start = windowEnd
+        return windows
+
+    def _backfill_statements(
+        self,
+        executor: ThreadPoolExecutor,
+        base_url: str,
+        currencies: list[str],
+        startDate: date,
+        checkpointDir: str | None,
+    ):
+        """The transactions of all currencies since startDate, one generator
+        per currency. The windows of all currencies are fetched concurrently.
+        Transactions on the border of two windows are only returned once.
+        """
+        windows = self._statement_windows(startDate)
+        pending = [
+            [
+                executor.submit(
+                    self._get_window_transactions,
+                    currency,
+                    base_url,
+                    window,
+                    checkpointDir,
+                )
+                for window in windows
+            ]
+            for currency in currencies
+        ]
+
+        def transactions(futures):
+            seen = set()
+            for future in futures:
+                for transaction in future.result():
+                    if transaction["referenceNumber"] not in seen:
+                        seen.add(transaction["referenceNumber"])
+                        yield transaction
+
+        return [transactions(futures) for futures in pending]
+
+    def _get_window_transactions(
+        self,
+        currency: str,
+        base_url: str,
+        window: tuple[datetime, datetime],
+        checkpointDir: str | None,
+    ) -> list[dict[str, Any]]:
+        """The transactions of currency in window. Windows that have ended are
+        kept in checkpointDir, so that an interrupted backfill doesn't fetch
+        them again."""
+        start, end = window
+        checkpointPath = None
+        if checkpointDir and end < datetime.now(timezone.utc):
+            checkpointPath = path.join(
+                checkpointDir,
+                f"{self.profileId}-{self.accountId}-{currency}-"
+                f"{start:%Y%m%d%H%M%S}-{end:%Y%m%d%H%M%S}.json",
+            )
+            if path.isfile(checkpointPath):
+                with open(checkpointPath, "r") as f:
+                    return json.load(f)
+
+        transactions = self._get_statement(
+            currency=currency,
+            base_url=base_url,
+            statement_type="FLAT",
+            interval=(start.isoformat(), end.isoformat()),
+        )["transactions"]
+
+        if checkpointPath:
+            os.makedirs(checkpointDir, exist_ok=True)
+            tmpPath = f"{checkpointPath}.{threading.get_ident()}.tmp"
+            with open(tmpPath, "w") as f:
+                json.dump(transactions, f)
+            os.replace(tmpPath, checkpointPath)
+
+        return transactions
+
     cmp = ReferenceDuplicatesComparator()
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
@@ -1,5 +1,6 @@
 import logging
-from datetime import timedelta
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
 from os import path
 from typing import Any
 
@@ -10,6 +11,7 @@ import yaml
 from beancount.core import amount, data
 from beancount.core.number import D
 
+from tariochbctools.importers.general import httpClient, tokenCache
 from tariochbctools.importers.general.deduplication import ReferenceDuplicatesComparator
 
 # https://docs.truelayer.com/#retrieve-account-transactions
@@ -26,6 +28,10 @@ TX_OPTIONAL_META_ID_FIELDS = (
     "provider_reference",
 )
 
+DEFAULT_CONCURRENCY = 4
+
+DEFAULT_SYNC_OVERLAP_DAYS = 3
+
 
 class Importer(beangulp.Importer):
     """An importer for Truelayer API (e.g. for Revolut)."""
@@ -37,6 +43,9 @@ class Importer(beangulp.Importer):
         self.refreshToken = None
         self.sandbox = None
         self.existing = None
+        self.session = None
+        self.token = None
+        self.cursors = {}
         self.domain = "truelayer.com"
 
     def _configure(self, filepath: str, existing: data.Entries) -> None:
@@ -51,6 +60,10 @@ class Importer(beangulp.Importer):
         if self.sandbox:
             self.domain = "truelayer-sandbox.com"
 
+        self.cursors = {}
+        if self.config.get("incremental_sync"):
+            self.cursors = self._cursors(existing or [])
+
         if "account" not in self.config and "accounts" not in self.config:
             raise KeyError("At least one of `account` or `accounts` must be specified")
 
@@ -63,7 +76,25 @@ class Importer(beangulp.Importer):
     def extract(self, filepath: str, existing: data.Entries = None) -> data.Entries:
         self._configure(filepath, existing)
 
-        r = requests.post(
+        self.session = httpClient.sharedClient()
+        self.token = tokenCache.CachedToken(
+            f"truelayer/{self.domain}/{self.clientId}/{self.refreshToken}",
+            self.clientSecret,
+            self._fetch_access_token,
+        )
+        concurrency = self.config.get("concurrency", DEFAULT_CONCURRENCY)
+
+        self.session.setHostLimit(f"api.{self.domain}", concurrency)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            entries = self._extract_endpoints_transactions(
+                executor, [("accounts", False), ("cards", True)]
+            )
+
+        return entries
+
+    def _fetch_access_token(self) -> tuple[str, int]:
+        r = self.session.post(
             f"https://auth.{self.domain}/connect/token",
             data={
                 "grant_type": "refresh_token",
@@ -73,16 +104,7 @@ class Importer(beangulp.Importer):
             },
         )
         tokens = r.json()
-        accessToken = tokens["access_token"]
-        headers = {"Authorization": "Bearer " + accessToken}
-
-        entries = []
-        entries.extend(self._extract_endpoint_transactions("accounts", headers))
-        entries.extend(
-            self._extract_endpoint_transactions("cards", headers, invert_sign=True)
-        )
-
-        return entries
+        return tokens["access_token"], tokens.get("expires_in", 0)
 
     def _get_account_for_account_id(self, account_id: str) -> data.Account:
         """
@@ -102,47 +124,114 @@ class Importer(beangulp.Importer):
 
         return self.config["accounts"].get(account_id, None)
 
-    def _extract_endpoint_transactions(
-        self, endpoint: str, headers: dict[str, str], invert_sign: bool = False
-    ) -> data.Entries:
-        entries = []
-        r = requests.get(
-            f"https://api.{self.domain}/data/v1/{endpoint}", headers=headers
+    def _get(self, url: str, params: dict[str, str] = None) -> requests.Response:
+        """Get url, retried once with a new access token if it was rejected."""
+        accessToken = self.token.token
+        r = self.session.get(
+            url, params=params, headers={"Authorization": "Bearer " + accessToken}
         )
+        if r.status_code == 401:
+            r = self.session.get(
+                url,
+                params=params,
+                headers={"Authorization": "Bearer " + self.token.renew(accessToken)},
+            )
+        return r
 
-        if not r:
-            try:
-                r.raise_for_status()
-            except requests.HTTPError as e:
-                logging.warning(e)
+    def _cursors(self, existing: data.Entries) -> dict[data.Account, date]:
+        """The date of the newest imported transaction per account, i.e. the
+        account of the first posting of the entries with a transaction_id.
+        """
+        cursors: dict[data.Account, date] = {}
+        for entry in existing:
+            if (
+                isinstance(entry, data.Transaction)
+                and entry.meta
+                and "transaction_id" in entry.meta
+                and entry.postings
+            ):
+                account = entry.postings[0].account
+                if account not in cursors or cursors[account] < entry.date:
+                    cursors[account] = entry.date
+        return cursors
+
+    def _transactions_params(
+        self, local_account: data.Account
+    ) -> dict[str, str] | None:
+        """Only request the transactions since the newest one imported into
+        the account, less an overlap for transactions that are booked late.
+        """
+        cursor = self.cursors.get(local_account)
+        if not cursor:
+            return None
 
-            return []
+        overlap = timedelta(
+            days=self.config.get("sync_overlap_days", DEFAULT_SYNC_OVERLAP_DAYS)
+        )
+        start = datetime.combine(cursor - overlap, time.min, timezone.utc)
+        return {
+            "from": start.isoformat(),
+            "to": datetime.now(timezone.utc).isoformat(),
+        }
 
-        for account in r.json()["results"]:
-            accountId = account["account_id"]
+    def _extract_endpoints_transactions(
+        self, executor: Executor, endpoints: list[tuple[str, bool]]
+    ) -> data.Entries:
+        """Fetch the accounts of all endpoints, then the balances and
+        transactions of all accounts concurrently. The entries are in the same
+        order as if everything was fetched one after the other.
+        """
+        accountLists = executor.map(
+            lambda endpoint: self._get(f"https://api.{self.domain}/data/v1/{endpoint}"),
+            [endpoint for endpoint, _ in endpoints],
+        )
 
-            local_account = self._get_account_for_account_id(accountId)
+        pending = []
+        for (endpoint, invert_sign), r in zip(endpoints, list(accountLists)):
+            if not r:
+                try:
+                    r.raise_for_status()
+                except requests.HTTPError as e:
+                    logging.warning(e)
 
-            if not local_account:
-                logging.warning("Ignoring account ID %s", accountId)
                 continue
 
-            r = requests.get(
-                f"https://api.{self.domain}/data/v1/{endpoint}/{accountId}/balance",
-                headers=headers,
-            )
-            balances = r.json()["results"]
+            for account in r.json()["results"]:
+                accountId = account["account_id"]
+
+                local_account = self._get_account_for_account_id(accountId)
+
+                if not local_account:
+                    logging.warning("Ignoring account ID %s", accountId)
+                    continue
+
+                url = f"https://api.{self.domain}/data/v1/{endpoint}/{accountId}"
+                pending.append(
+                    (
+                        local_account,
+                        invert_sign,
+                        executor.submit(self._get, f"{url}/balance"),
+                        executor.submit(
+                            self._get,
+                            f"{url}/transactions",
+                            self._transactions_params(local_account),
+                        ),
+                    )
+                )
+
+        entries = []
+        for local_account, invert_sign, balanceResponse, trxResponse in pending:
+            balances = balanceResponse.result().json()["results"]
 
             for balance in balances:
                 entries.extend(
                     self._extract_balance(balance, local_account, invert_sign)
                 )
 
-            r = requests.get(
-                f"https://api.{self.domain}/data/v1/{endpoint}/{accountId}/transactions",
-                headers=headers,
+            transactions = sorted(
+                trxResponse.result().json()["results"],
+                key=lambda trx: trx["timestamp"],
             )
-            transactions = sorted(r.json()["results"], key=lambda trx: trx["timestamp"])
 
             for trx in transactions:
                 entries.extend(
@@ -255,3 +344,6 @@ class Importer(beangulp.Importer):
         return entries
 
     cmp = ReferenceDuplicatesComparator(TX_MANDATORY_ID_FIELDS)
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
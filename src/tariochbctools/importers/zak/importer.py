@@ -131,3 +131,6 @@ class Importer(beangulp.Importer):
         return entries
 
     cmp = ReferenceDuplicatesComparator(["zakref"])
+
+    def deduplicate(self, entries: data.Entries, existing: data.Entries) -> None:
+        self.cmp.deduplicate(entries, existing)
@@ -1,9 +1,18 @@
 """A plugin that verifies that on each transaction, all the "portfolios" have
 the same weight.
+
+The transactions can be checked on a process pool by passing a config like
+"{'workers': 4}", the errors are reported in the same order as serially. The
+workers are forked, so this needs the fork start method (it's checked serially
+otherwise).
 """
 
+import ast
 import collections
+import multiprocessing
+import sys
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from decimal import Decimal
 from math import isclose
 
@@ -18,50 +27,151 @@ DifferentWeightPerPortfolio = collections.namedtuple(
     "DifferentWeightPerPortfolio", "source message entry"
 )
 
+CHUNKS_PER_WORKER = 4
+
+_portfolios: dict[str, str] = {}
+
+# The transactions checked by the forked workers
+_transactions: list[data.Transaction] = []
+
+
+def check(entries, options_map, config=None):
+    workers = ast.literal_eval(config).get("workers", 1) if config else 1
+    transactions = list(data.filter_txns(entries))
+
+    if (
+        workers > 1
+        and len(transactions) > workers
+        and "fork" in multiprocessing.get_all_start_methods()
+    ):
+        chunkSize = -(-len(transactions) // (workers * CHUNKS_PER_WORKER))
+        starts = range(0, len(transactions), chunkSize)
+        ends = [min(start + chunkSize, len(transactions)) for start in starts]
+        # The workers are forked once the transactions are set, so they
+        # inherit them instead of receiving them pickled.
+        global _transactions
+        _transactions = transactions
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                found = [
+                    error
+                    for chunkErrors in executor.map(_checkRange, starts, ends)
+                    for error in chunkErrors
+                ]
+        finally:
+            _transactions = []
+    else:
+        found = _checkChunk(transactions, 0, len(transactions))
 
-def check(entries, options_map):
     errors = []
+    for index, errorType, message in found:
+        entry = transactions[index]
+        errors.append(errorType(entry.meta, message, entry))
 
-    for entry in data.filter_txns(entries):
-        positivePortfolioSums = defaultdict(Decimal)
-        negativePortfolioSums = defaultdict(Decimal)
-        for posting in entry.postings:
-            if posting.meta and "portfolio_check_weight" in posting.meta:
-                weight = Decimal(posting.meta["portfolio_check_weight"])
-            else:
-                weight = round(convert.get_weight(posting).number, 2)
-            account = posting.account
-            portfolio = account.split(":")[1]
-            if weight > 0:
-                positivePortfolioSums[portfolio] += weight
-            else:
-                negativePortfolioSums[portfolio] += weight
-
-        portfolios = set(
-            list(positivePortfolioSums.keys()) + list(negativePortfolioSums.keys())
-        )
-        weight = None
-        for portfolio in portfolios:
-            positiveWeight = positivePortfolioSums[portfolio]
-            negativeWeight = -negativePortfolioSums[portfolio]
-            if not isclose(positiveWeight, negativeWeight, abs_tol=0.05):
-                errors.append(
-                    NonZeroWeightPerPortfolio(
-                        entry.meta,
-                        f"Weights for portfolio {portfolio} don't equal zero {positiveWeight} != {-negativeWeight}",
-                        entry,
-                    )
-                )
-            if (
-                weight
-                and weight != positiveWeight
-                and "skip_cross_portfolio_check" not in entry.meta
-            ):
-                errors.append(
-                    DifferentWeightPerPortfolio(
-                        entry.meta, "Not all portfolios have the same weight", entry
-                    )
+    return entries, errors
+
+
+def _checkRange(start, end):
+    return _checkChunk(_transactions, start, end)
+
+
+def _checkChunk(transactions, start, end):
+    """Check the transactions from start to end, returns (index, error type,
+    message) tuples.
+
+    The errors only refer to the transactions by index, so that a chunk
+    checked in another process doesn't return copies of the entries.
+    """
+    errors = []
+    for index in range(start, end):
+        for errorType, message in _checkTransaction(transactions[index]):
+            errors.append((index, errorType, message))
+
+    return errors
+
+
+def _portfolio(account):
+    portfolio = _portfolios.get(account)
+    if portfolio is None:
+        portfolio = sys.intern(account.split(":")[1])
+        _portfolios[account] = portfolio
+    return portfolio
+
+
+def _checkTransaction(entry):
+    """Check the transaction on whole cents, only falling back to the Decimal
+    check if it might have errors or a weight isn't a whole number of cents.
+    """
+    positive = {}
+    negative = {}
+    for posting in entry.postings:
+        if posting.meta and "portfolio_check_weight" in posting.meta:
+            weight = Decimal(posting.meta["portfolio_check_weight"])
+            if weight.as_tuple().exponent < -2:
+                return _checkTransactionDecimal(entry)
+            cents = int(weight * 100)
+        elif posting.cost is None and posting.price is None:
+            cents = round(posting.units.number * 100)
+        else:
+            cents = round(convert.get_weight(posting).number * 100)
+        portfolio = _portfolio(posting.account)
+        if cents > 0:
+            positive[portfolio] = positive.get(portfolio, 0) + cents
+        else:
+            negative[portfolio] = negative.get(portfolio, 0) + cents
+
+    weights = set()
+    for portfolio in positive.keys() | negative.keys():
+        positiveCents = positive.get(portfolio, 0)
+        if positiveCents != -negative.get(portfolio, 0):
+            return _checkTransactionDecimal(entry)
+        weights.add(positiveCents)
+
+    if len(weights) > 1 and "skip_cross_portfolio_check" not in entry.meta:
+        return _checkTransactionDecimal(entry)
+
+    return []
+
+
+def _checkTransactionDecimal(entry):
+    errors = []
+    positivePortfolioSums = defaultdict(Decimal)
+    negativePortfolioSums = defaultdict(Decimal)
+    for posting in entry.postings:
+        if posting.meta and "portfolio_check_weight" in posting.meta:
+            weight = Decimal(posting.meta["portfolio_check_weight"])
+        else:
+            weight = round(convert.get_weight(posting).number, 2)
+        portfolio = _portfolio(posting.account)
+        if weight > 0:
+            positivePortfolioSums[portfolio] += weight
+        else:
+            negativePortfolioSums[portfolio] += weight
+
+    portfolios = sorted(
+        set(list(positivePortfolioSums.keys()) + list(negativePortfolioSums.keys()))
+    )
+    weight = None
+    for portfolio in portfolios:
+        positiveWeight = positivePortfolioSums[portfolio]
+        negativeWeight = -negativePortfolioSums[portfolio]
+        if not isclose(positiveWeight, negativeWeight, abs_tol=0.05):
+            errors.append(
+                (
+                    NonZeroWeightPerPortfolio,
+                    f"Weights for portfolio {portfolio} don't equal zero {positiveWeight} != {-negativeWeight}",
                 )
-            weight = positiveWeight
+            )
+        if (
+            weight
+            and weight != positiveWeight
+            and "skip_cross_portfolio_check" not in entry.meta
+        ):
+            errors.append(
+                (DifferentWeightPerPortfolio, "Not all portfolios have the same weight")
+            )
+        weight = positiveWeight
 
-    return entries, errors
+    return errors
@@ -1,15 +1,36 @@
 """A plugin that inserts an additional price to the base rate by applying
 fx rate to a price.
+
+The config is either just the base ccy, e.g. "CHF", or a dict like
+"{'baseCcy': 'CHF', 'incremental': True, 'cache': 'prices.cache.json'}".
+In incremental mode the generated prices are cached per (currency, quote ccy)
+pair and only recomputed for pairs whose prices or fx rates changed since the
+last load. The cache is kept in memory (e.g. for fava reloads) and, if a cache
+file is given (relative to the ledger), also across runs.
 """
 
+import ast
+import hashlib
+import json
+from collections import defaultdict
+from os import path
+
 from beancount.core import amount, data, prices
+from beancount.core.number import D
 
 __plugins__ = ["generate"]
 
+_memoryCache: dict[str, dict] = {}
+
+
+def generate(entries, options_map, config):
+    baseCcy, incremental, cachePath = _parseConfig(config, options_map)
+    if incremental:
+        return _generateIncremental(entries, baseCcy, cachePath)
 
-def generate(entries, options_map, baseCcy):
     errors = []
     priceMap = prices.build_price_map(entries)
+    existingDates = _PriceDates(priceMap)
 
     additionalEntries = []
     for entry in entries:
@@ -20,9 +41,7 @@ def generate(entries, options_map, baseCcy):
         ):
             fxTuple = tuple([entry.amount.currency, baseCcy])
             fxRate = prices.get_price(priceMap, fxTuple, entry.date)
-            if fxRate[1] and not _alreadyExistingPrice(
-                priceMap, tuple([entry.currency, baseCcy]), entry.date
-            ):
+            if fxRate[1] and existingDates.add((entry.currency, baseCcy), entry.date):
                 priceInBaseCcy = amount.Amount(entry.amount.number * fxRate[1], baseCcy)
 
                 additionalEntries.append(
@@ -34,10 +53,172 @@ def generate(entries, options_map, baseCcy):
     return entries, errors
 
 
-def _alreadyExistingPrice(priceMap, fxTuple, date):
-    if fxTuple in priceMap:
-        for alreadyExistingPriceDates in priceMap[fxTuple]:
-            if date == alreadyExistingPriceDates[0]:
-                return True
+def _parseConfig(config, options_map):
+    if not config.strip().startswith("{"):
+        return config, False, None
+
+    configDict = ast.literal_eval(config)
+    cachePath = configDict.get("cache")
+    if cachePath and options_map.get("filename"):
+        cachePath = path.join(path.dirname(options_map["filename"]), cachePath)
+
+    return configDict["baseCcy"], configDict.get("incremental", False), cachePath
+
+
+class _PriceDates:
+    """The dates on which a price exists, per pair of a price map.
+
+    The date set of a pair is built on first use.
+    """
+
+    def __init__(self, priceMap):
+        self.priceMap = priceMap
+        self.dates = {}
+
+    def contains(self, fxTuple, date):
+        if fxTuple not in self.dates:
+            self.dates[fxTuple] = {d for d, _ in self.priceMap.get(fxTuple, ())}
+        return date in self.dates[fxTuple]
+
+    def add(self, fxTuple, date):
+        """Add the date, returns False if it already existed."""
+        if self.contains(fxTuple, date):
+            return False
+        self.dates[fxTuple].add(date)
+        return True
+
+
+def _digest(priceEntries):
+    return hashlib.sha256(
+        "\n".join(
+            [
+                f"{entry.date.toordinal()}|{entry.amount.number}"
+                for entry in priceEntries
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def _generateIncremental(entries, baseCcy, cachePath):
+    byPair = defaultdict(list)
+    indices = defaultdict(list)
+    for index, entry in enumerate(entries):
+        if isinstance(entry, data.Price):
+            pair = (entry.currency, entry.amount.currency)
+            byPair[pair].append(entry)
+            indices[pair].append(index)
+
+    cache = _memoryCache.setdefault(cachePath or "", {})
+    if cachePath and not cache and path.isfile(cachePath):
+        with open(cachePath, "r") as f:
+            cache.update(json.load(f))
+
+    # A pair's generated prices only depend on its own prices, the fx rates
+    # between its quote ccy and the base ccy and the prices already existing
+    # in the base ccy.
+    priceMaps = {}
+
+    def priceMapFor(ccys):
+        if ccys not in priceMaps:
+            priceMaps[ccys] = _pairsPriceMap(byPair, ccys)
+        return priceMaps[ccys]
+
+    # Each series is hashed once, even if many pairs depend on it (e.g. the
+    # fx rate of a quote ccy shared by all instruments priced in it)
+    seriesDigests = {}
+
+    def seriesDigest(pair):
+        if pair not in seriesDigests:
+            seriesDigests[pair] = _digest(byPair.get(pair, []))
+        return seriesDigests[pair]
+
+    generated = {}
+    usedKeys = set()
+    changed = False
+    for (currency, quoteCcy), pairEntries in byPair.items():
+        if baseCcy in (currency, quoteCcy):
+            continue
+
+        digest = "/".join(
+            seriesDigest(pair)
+            for pair in [
+                (currency, quoteCcy),
+                (quoteCcy, baseCcy),
+                (baseCcy, quoteCcy),
+                (currency, baseCcy),
+                (baseCcy, currency),
+            ]
+        )
+        key = f"{currency}/{quoteCcy}/{baseCcy}"
+        usedKeys.add(key)
+
+        cached = cache.get(key)
+        if not cached or cached["digest"] != digest:
+            changed = True
+            cached = {
+                "digest": digest,
+                "numbers": _generatePair(pairEntries, baseCcy, priceMapFor),
+            }
+            cache[key] = cached
+
+        generated[currency, quoteCcy] = cached["numbers"]
+
+    for key in set(cache) - usedKeys:
+        changed = True
+        del cache[key]
+
+    if changed and cachePath:
+        with open(cachePath, "w") as f:
+            json.dump(cache, f)
+
+    # The generated prices are added in the order of the prices they are
+    # generated from, like in the full mode
+    candidates = []
+    for pair, numbers in generated.items():
+        candidates.extend(
+            (index, entry, number)
+            for index, entry, number in zip(indices[pair], byPair[pair], numbers)
+            if number is not None
+        )
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    additionalEntries = []
+    generatedDates = set()
+    for _, entry, number in candidates:
+        if (entry.currency, entry.date) not in generatedDates:
+            generatedDates.add((entry.currency, entry.date))
+            additionalEntries.append(
+                data.Price(
+                    entry.meta,
+                    entry.date,
+                    entry.currency,
+                    amount.Amount(D(number), baseCcy),
+                )
+            )
+
+    entries.extend(additionalEntries)
+
+    return entries, []
+
+
+def _pairsPriceMap(byPair, ccys):
+    first, second = ccys
+    return prices.build_price_map(
+        byPair.get((first, second), []) + byPair.get((second, first), [])
+    )
+
+
+def _generatePair(pairEntries, baseCcy, priceMapFor):
+    currency, quoteCcy = pairEntries[0].currency, pairEntries[0].amount.currency
+    fxMap = priceMapFor((quoteCcy, baseCcy))
+    existingDates = _PriceDates(priceMapFor((currency, baseCcy)))
+
+    numbers = []
+    for entry in pairEntries:
+        fxRate = prices.get_price(fxMap, (quoteCcy, baseCcy), entry.date)
+        if fxRate[1] and existingDates.add((currency, baseCcy), entry.date):
+            numbers.append(str(entry.amount.number * fxRate[1]))
+        else:
+            numbers.append(None)
 
-    return False
+    return numbers
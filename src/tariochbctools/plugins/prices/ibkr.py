@@ -1,3 +1,5 @@
+import hashlib
+import threading
 from datetime import datetime
 from os import environ
 from time import sleep
@@ -8,20 +10,38 @@ from beanprice import source
 from dateutil import tz
 from ibflex import client, parser
 
+from tariochbctools.importers.ibkr import flexCache
+from tariochbctools.importers.ibkr.importer import cleanupSymbol
+
+_symbolIndex: tuple[str, dict] = ("", {})
+_symbolIndexLock = threading.Lock()
+
+
+def symbolIndex(response: bytes) -> dict:
+    """The open positions of the statement by symbol, as (markPrice, reportDate,
+    currency). The index of the last statement is kept, so that a bean-price run
+    over many tickers parses the statement only once.
+    """
+    global _symbolIndex
+    digest = hashlib.sha256(response).hexdigest()
+    with _symbolIndexLock:
+        if _symbolIndex[0] != digest:
+            index: dict = {}
+            statement = parser.parse(response)
+            for custStatement in statement.FlexStatements:
+                for position in custStatement.OpenPositions:
+                    index.setdefault(
+                        cleanupSymbol(position.symbol),
+                        (position.markPrice, position.reportDate, position.currency),
+                    )
+            _symbolIndex = (digest, index)
+
+        return _symbolIndex[1]
+
 
 class Source(source.Source):
     def download(self, token, queryId):
-        stmt_access = client.request_statement(
-            token,
-            queryId,
-            "https://ndcdyn.interactivebrokers.com/AccountManagement/FlexWebService/SendRequest",
-        )
-        response = client.submit_request(
-            url=stmt_access.Url, token=token, query=stmt_access.ReferenceCode
-        )
-        client.check_statement_response(response)
-
-        return response.content
+        return flexCache.download(token, queryId)
 
     def get_latest_price(self, ticker: str) -> source.SourcePrice | None:
         token: str = environ["IBKR_TOKEN"]
@@ -36,22 +56,16 @@ class Source(source.Source):
             else:
                 raise e
 
-        statement = parser.parse(response)
-        for custStatement in statement.FlexStatements:
-            for position in custStatement.OpenPositions:
-                symbol = position.symbol
-                symbol = symbol.rstrip("z")
-                symbol, _, _ = symbol.partition(".")
-                if symbol == ticker:
-                    price = D(position.markPrice)
-                    timezone = tz.gettz("Europe/Zurich")
-                    time = datetime.combine(
-                        position.reportDate, datetime.min.time()
-                    ).astimezone(timezone)
-
-                    return source.SourcePrice(price, time, position.currency)
+        position = symbolIndex(response).get(ticker)
+        if not position:
+            return None
 
-        return None
+        markPrice, reportDate, currency = position
+        price = D(markPrice)
+        timezone = tz.gettz("Europe/Zurich")
+        time = datetime.combine(reportDate, datetime.min.time()).astimezone(timezone)
+
+        return source.SourcePrice(price, time, currency)
 
     def get_historical_price(
         self, ticker: str, time: datetime
@@ -0,0 +1,99 @@
+from datetime import date, timedelta
+
+import pytest
+
+from tariochbctools.importers.bitst import importer as bitstimp
+
+TEST_CONFIG = """
+username: "12345"
+key: "MyKey"
+secret: "MySecret"
+account: "Assets:Bitstamp"
+otherExpensesAccount: "Expenses:Fee"
+capGainAccount: "Income:Capitalgain"
+monthCutoff: 3
+currencies:
+  - eur
+  - btc
+"""
+
+
+class FakeTrading:
+    """user_transactions of an account with a withdrawal per day, newest first"""
+
+    transactions = []
+    requested = []
+
+    def __init__(self, username, key, secret):
+        pass
+
+    def user_transactions(self, offset=0, limit=100):
+        self.requested.append(offset)
+        return self.transactions[offset : offset + limit]
+
+
+@pytest.fixture(name="client")
+def client_fixture(monkeypatch):
+    FakeTrading.requested = []
+    FakeTrading.transactions = [
+        {
+            "id": id,
+            "type": "1",
+            "datetime": f"{date.today() - timedelta(days=3000 - id)} 10:00:00.123456",
+            "eur": "-1.5",
+            "fee": "0",
+        }
+        for id in reversed(range(3000))
+    ]
+    monkeypatch.setattr(bitstimp, "PAGE_SIZE", 10)
+    monkeypatch.setattr(bitstimp.bitstamp.client, "Trading", FakeTrading)
+    yield FakeTrading
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path):
+    config = tmp_path / "bitstamp.yaml"
+    config.write_text(TEST_CONFIG)
+    yield config
+
+
+def test_extract_stops_at_cutoff(client, config):
+    entries = bitstimp.Importer().extract(str(config), [])
+
+    cutoff = date.today() - bitstimp.relativedelta(months=3)
+    days = (date.today() - cutoff).days
+    assert [e.date for e in entries] == [
+        date.today() - timedelta(days=day) for day in reversed(range(1, days))
+    ]
+    # the transaction of the cutoff day is the days-th one
+    assert client.requested == list(range(0, (days - 1) // 10 * 10 + 10, 10))
+
+
+def test_extract_from_cache(client, config, tmp_path):
+    config.write_text(TEST_CONFIG + "cacheFile: bitstamp.json\n")
+    first = bitstimp.Importer().extract(str(config), [])
+
+    client.requested.clear()
+    client.transactions.insert(
+        0, dict(client.transactions[0], id=3000, datetime=f"{date.today()} 11:00:00")
+    )
+    second = bitstimp.Importer().extract(str(config), [])
+
+    assert client.requested == [0]
+    assert [e.meta["ref"] for e in second] == [e.meta["ref"] for e in first] + ["3000"]
+
+
+def test_extract_cache_before_cutoff(client, config):
+    config.write_text(TEST_CONFIG + "cacheFile: bitstamp.json\n")
+    bitstimp.Importer().extract(str(config), [])
+
+    client.requested.clear()
+    config.write_text(
+        TEST_CONFIG.replace("monthCutoff: 3", "monthCutoff: 6")
+        + "cacheFile: bitstamp.json\n"
+    )
+    entries = bitstimp.Importer().extract(str(config), [])
+
+    cutoff = date.today() - bitstimp.relativedelta(months=6)
+    assert entries[0].date == cutoff + timedelta(days=1)
+    assert len(client.requested) > 10
@@ -0,0 +1,231 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from beancount.core import data
+from beancount.core.number import D
+
+from tariochbctools.importers.blockchain import backends
+from tariochbctools.importers.blockchain import importer as bcimp
+
+TEST_CONFIG = """
+base_ccy: CHF
+requests_per_second: 1000
+cache_dir: cache
+addresses:
+  - address: "ADDRESS1"
+    currency: "BTC"
+    narration: "First"
+    asset_account: "Assets:Crypto:BTC"
+  - address: "ADDRESS2"
+    currency: "BTC"
+    narration: "Second"
+    asset_account: "Assets:Crypto:BTC"
+"""
+
+
+def txref(address, height, tip):
+    return {
+        "tx_hash": f"{address}-{height}",
+        "block_height": height,
+        "confirmations": tip - height + 1,
+        "value": 100000,
+        "confirmed": datetime(2024, 1, 1, 10, tzinfo=timezone.utc),
+    }
+
+
+class FakeApi:
+    def __init__(self):
+        self.tip = 110
+        self.limit = None
+        self.requested = []
+        self.bothRequested = threading.Barrier(2)
+
+    def get_address_details(
+        self,
+        address,
+        coin_symbol,
+        txn_limit=None,
+        api_key=None,
+        before_bh=None,
+        after_bh=None,
+    ):
+        self.requested.append((address, after_bh))
+        self.bothRequested.wait(timeout=5)
+        txrefs = [
+            txref(address, height, self.tip)
+            for height in range(self.tip, after_bh or 0, -10)
+            if before_bh is None or height < before_bh
+        ]
+        limit = min(txn_limit, self.limit or txn_limit)
+        return {"txrefs": txrefs[:limit], "hasMore": len(txrefs) > limit}
+
+
+@pytest.fixture(name="blockcypher_api")
+def blockcypher_api_fixture(monkeypatch):
+    """Each address has a transaction in every 10th block up to the tip"""
+    api = FakeApi()
+    monkeypatch.setattr(
+        bcimp.blockcypher, "get_address_details", api.get_address_details
+    )
+    yield api
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path):
+    config = tmp_path / "blockchain.yaml"
+    config.write_text(TEST_CONFIG)
+    yield config
+
+
+@pytest.fixture(name="existing")
+def existing_fixture():
+    yield [
+        data.Price(
+            data.new_metadata("prices", 0),
+            date(2024, 1, 1),
+            "BTC",
+            data.Amount(D("40000"), "CHF"),
+        )
+    ]
+
+
+def test_extract_addresses_concurrently(config, existing, blockcypher_api):
+    entries = bcimp.Importer().extract(str(config), existing)
+
+    assert [e.meta["ref"] for e in entries] == [
+        f"ADDRESS{i}-{height}" for i in (1, 2) for height in range(110, 0, -10)
+    ]
+    assert entries[0].postings[0].units == data.Amount(D("0.001"), "BTC")
+    assert sorted(blockcypher_api.requested) == [
+        ("ADDRESS1", None),
+        ("ADDRESS2", None),
+    ]
+
+
+def test_extract_only_fetches_new_blocks(config, existing, blockcypher_api):
+    first = bcimp.Importer().extract(str(config), existing)
+
+    blockcypher_api.requested.clear()
+    blockcypher_api.tip = 130
+    second = bcimp.Importer().extract(str(config), existing)
+
+    # blocks with less than 6 confirmations weren't cached
+    assert sorted(blockcypher_api.requested) == [("ADDRESS1", 100), ("ADDRESS2", 100)]
+    assert [e.meta["ref"] for e in second] == [
+        f"ADDRESS{i}-{height}" for i in (1, 2) for height in range(130, 0, -10)
+    ]
+    assert len(second) == len(first) + 4
+
+
+def test_extract_pages_truncated_responses(config, existing, blockcypher_api):
+    blockcypher_api.limit = 4
+    entries = bcimp.Importer().extract(str(config), existing)
+
+    assert [e.meta["ref"] for e in entries] == [
+        f"ADDRESS{i}-{height}" for i in (1, 2) for height in range(110, 0, -10)
+    ]
+    # the lowest block of a truncated response is fetched again
+    assert len(blockcypher_api.requested) == 2 * 4
+
+    blockcypher_api.requested.clear()
+    blockcypher_api.tip = 130
+    second = bcimp.Importer().extract(str(config), existing)
+
+    assert sorted(blockcypher_api.requested) == [("ADDRESS1", 100), ("ADDRESS2", 100)]
+    assert len(second) == len(entries) + 4
+
+
+def test_rate_limit_is_retried(monkeypatch, config, existing, blockcypher_api):
+    get_address_details = bcimp.blockcypher.get_address_details
+    limited = set()
+
+    def rate_limited(address, **kwargs):
+        if address not in limited:
+            limited.add(address)
+            raise backends.RateLimitError("Status Code 429")
+        return get_address_details(address, **kwargs)
+
+    monkeypatch.setattr(backends, "RATE_LIMIT_BACKOFF", 0)
+    monkeypatch.setattr(bcimp.blockcypher, "get_address_details", rate_limited)
+
+    entries = bcimp.Importer().extract(str(config), existing)
+
+    assert len(entries) == 22
+
+
+def test_throttle():
+    throttle = backends.Throttle(50)
+
+    start = time.monotonic()
+    for _ in range(6):
+        throttle.wait()
+
+    assert time.monotonic() - start >= 0.1
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(name="recorded")
+def recorded_fixture(tmp_path):
+    """Address details as recorded from the api"""
+    recorded = tmp_path / "recorded"
+    recorded.mkdir()
+    for address in ("ADDRESS1", "ADDRESS2"):
+        txrefs = [
+            dict(
+                txref(address, height, 110),
+                confirmed=f"2024-01-01T10:00:{height % 60:02}Z",
+            )
+            for height in range(110, 0, -10)
+        ]
+        (recorded / f"btc-{address}.json").write_text(
+            json.dumps({"address": address, "txrefs": txrefs})
+        )
+    yield recorded
+
+
+def test_replay_from_files(config, existing, recorded):
+    config.write_text(TEST_CONFIG + "replay: recorded\n")
+
+    first = bcimp.Importer().extract(str(config), existing)
+    second = bcimp.Importer().extract(str(config), existing)
+
+    assert [e.meta["ref"] for e in first] == [
+        f"ADDRESS{i}-{height}" for i in (1, 2) for height in range(110, 0, -10)
+    ]
+    assert [e.meta["ref"] for e in second] == [e.meta["ref"] for e in first]
+    assert first[0].postings[0].units == data.Amount(D("0.001"), "BTC")
+
+
+def test_replay_from_http(config, existing, recorded):
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=recorded)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = backends.ReplayBackend(f"http://127.0.0.1:{server.server_address[1]}")
+        entries = bcimp.Importer(backend).extract(str(config), existing)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(entries) == 22
+
+
+def test_replay_after_block_height(recorded):
+    details = backends.ReplayBackend(str(recorded)).addressDetails(
+        "ADDRESS1", "BTC", 80
+    )
+
+    assert [txref["block_height"] for txref in details["txrefs"]] == [110, 100, 90]
+    assert details["txrefs"][0]["confirmed"] == datetime(
+        2024, 1, 1, 10, 0, 50, tzinfo=timezone.utc
+    )
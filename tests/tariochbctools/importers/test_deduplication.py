@@ -0,0 +1,80 @@
+import datetime
+
+import pytest
+from beancount.core import data
+from beangulp.extract import DUPLICATE, mark_duplicate_entries
+
+from tariochbctools.importers.general.deduplication import (
+    ReferenceDuplicatesComparator,
+    ReferenceIndex,
+)
+
+
+def _entry(day, **metakv):
+    meta = data.new_metadata("test", 0, metakv)
+    return data.Transaction(
+        meta,
+        datetime.date(2024, 1, day),
+        "*",
+        "",
+        "",
+        data.EMPTY_SET,
+        data.EMPTY_SET,
+        [],
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_index():
+    ReferenceIndex.invalidate()
+    yield
+    ReferenceIndex.invalidate()
+
+
+def test_deduplicate_matches_pairwise_comparison():
+    cmp = ReferenceDuplicatesComparator(["nordref"])
+    existing = [
+        _entry(1, nordref="a"),
+        _entry(5, nordref="b"),
+        _entry(10, nordref="c"),
+        _entry(10, ref="d"),
+    ]
+    new = [
+        _entry(2, nordref="a"),
+        _entry(9, nordref="b"),
+        _entry(10, nordref="d"),
+        _entry(11, nordref="c"),
+    ]
+    expected = [_entry(e.date.day, **e.meta) for e in new]
+
+    mark_duplicate_entries(expected, list(existing), datetime.timedelta(days=2), cmp)
+    cmp.deduplicate(new, existing)
+
+    assert [e.meta.get(DUPLICATE) for e in new] == [
+        e.meta.get(DUPLICATE) for e in expected
+    ]
+    assert new[0].meta[DUPLICATE] is existing[0]
+    assert DUPLICATE not in new[1].meta
+    assert DUPLICATE not in new[2].meta
+    assert new[3].meta[DUPLICATE] is existing[2]
+
+
+def test_index_is_reused_and_extended():
+    existing = [_entry(1, ref="a")]
+    index = ReferenceIndex.get(existing, ["ref"])
+
+    existing.append(_entry(2, ref="b"))
+    assert ReferenceIndex.get(existing, ["ref"]) is index
+    assert index.lookup({"b"}, ["ref"]) == [existing[1]]
+
+
+def test_index_is_rebuilt_when_reordered():
+    existing = [_entry(3, ref="a"), _entry(4, ref="b")]
+    index = ReferenceIndex.get(existing, ["ref"])
+
+    existing.append(_entry(1, ref="c"))
+    existing.sort(key=lambda e: e.date)
+    rebuilt = ReferenceIndex.get(existing, ["ref"])
+    assert rebuilt is not index
+    matches = rebuilt.lookup({"a", "b", "c"}, ["ref"])
+    assert sorted(matches, key=lambda e: e.date) == existing
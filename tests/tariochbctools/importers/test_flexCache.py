@@ -0,0 +1,127 @@
+import io
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tariochbctools.importers.ibkr import flexCache
+
+
+@pytest.fixture
+def requests(tmp_path, monkeypatch):
+    monkeypatch.setenv("TARIOCHBCTOOLS_FLEX_CACHE", str(tmp_path))
+    calls = []
+
+    def requestStatement(token, queryId, f):
+        calls.append((token, queryId))
+        f.write(f"<FlexQueryResponse {len(calls)}/>".encode("utf-8"))
+
+    monkeypatch.setattr(flexCache, "requestStatement", requestStatement)
+    return calls
+
+
+def test_download_is_cached_per_query(requests):
+    first = flexCache.download("token", "1")
+
+    assert flexCache.download("token", "1") == first
+    assert flexCache.download("token", "2") != first
+    assert requests == [("token", "1"), ("token", "2")]
+
+
+def test_download_expires(requests, tmp_path):
+    flexCache.download("token", "1")
+    for f in tmp_path.iterdir():
+        old = time.time() - flexCache.DEFAULT_TTL - 1
+        os.utime(f, (old, old))
+
+    assert flexCache.download("token", "1") == b"<FlexQueryResponse 2/>"
+
+
+def test_download_without_cache(requests, monkeypatch):
+    monkeypatch.setenv("TARIOCHBCTOOLS_FLEX_CACHE_TTL", "0")
+    flexCache.download("token", "1")
+    flexCache.download("token", "1")
+
+    assert len(requests) == 2
+
+
+def test_concurrent_downloads_share_one_request(requests):
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flexCache.download("t", "1")))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(requests) == 1
+    assert set(results) == {b"<FlexQueryResponse 1/>"}
+
+
+def test_open_statement_reads_the_cache_file(requests, tmp_path):
+    with flexCache.openStatement("token", "1") as f:
+        assert f.name.startswith(str(tmp_path))
+        assert f.read() == b"<FlexQueryResponse 1/>"
+
+    with flexCache.openStatement("token", "1") as f:
+        assert f.read() == b"<FlexQueryResponse 1/>"
+    assert len(requests) == 1
+
+
+def test_open_statement_without_cache(requests, tmp_path, monkeypatch):
+    monkeypatch.setenv("TARIOCHBCTOOLS_FLEX_CACHE_TTL", "0")
+
+    with flexCache.openStatement("token", "1") as f:
+        assert f.read() == b"<FlexQueryResponse 1/>"
+    assert list(tmp_path.iterdir()) == []
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunkSize):
+        return (
+            self.content[i : i + chunkSize]
+            for i in range(0, len(self.content), chunkSize)
+        )
+
+
+def test_request_statement_is_streamed_after_generation(monkeypatch):
+    busy = (
+        b'<FlexStatementResponse timestamp="01 January, 2024 10:00 AM EST">'
+        b"<Status>Warn</Status><ErrorCode>1019</ErrorCode>"
+        b"<ErrorMessage>Statement generation in progress.</ErrorMessage>"
+        b"</FlexStatementResponse>"
+    )
+    statement = b"<FlexQueryResponse>" + b"<Trade />" * 10_000 + b"</FlexQueryResponse>"
+    responses = [FakeResponse(busy), FakeResponse(statement)]
+    requested = []
+
+    def get(url, **kwargs):
+        requested.append(kwargs["stream"])
+        return responses.pop(0)
+
+    monkeypatch.setattr(
+        flexCache.client,
+        "request_statement",
+        lambda token, queryId, url: SimpleNamespace(Url="url", ReferenceCode="ref"),
+    )
+    monkeypatch.setattr(flexCache.requests, "get", get)
+    monkeypatch.setattr(flexCache.time, "sleep", lambda seconds: None)
+
+    f = io.BytesIO()
+    flexCache.requestStatement("token", "1", f)
+
+    assert f.getvalue() == statement
+    assert requested == [True, True]
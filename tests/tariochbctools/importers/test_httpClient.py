@@ -0,0 +1,144 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tariochbctools.importers.general import httpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.requests += 1
+            server.active += 1
+            server.maxActive = max(server.maxActive, server.active)
+            status = server.statuses.pop(0) if server.statuses else 200
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+
+        body = b"{}"
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Retry-After", server.retryAfter)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(name="server")
+def server_fixture():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    server.connections = set()
+    server.requests = 0
+    server.active = 0
+    server.maxActive = 0
+    server.statuses = []
+    server.delay = 0
+    server.retryAfter = "0"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/"
+
+
+def test_connections_are_kept_alive(server):
+    client = httpClient.HttpClient()
+    for _ in range(5):
+        assert client.get(url(server)).status_code == 200
+
+    assert server.requests == 5
+    assert len(server.connections) == 1
+
+
+def test_retries_with_backoff(server):
+    server.statuses = [503, 429]
+    client = httpClient.HttpClient(backoff=0)
+
+    assert client.get(url(server)).status_code == 200
+    assert server.requests == 3
+
+
+def test_returns_last_response_when_retries_are_exhausted(server):
+    server.statuses = [503, 503, 503]
+    client = httpClient.HttpClient(retries=1, backoff=0)
+
+    assert client.get(url(server)).status_code == 503
+
+
+def test_limits_concurrent_requests_per_host(server):
+    server.delay = 0.05
+    client = httpClient.HttpClient(hostLimit=2)
+    threads = [
+        threading.Thread(target=client.get, args=(url(server),)) for _ in range(6)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert server.requests == 6
+    assert server.maxActive == 2
+
+    server.maxActive = 0
+    client.setHostLimit(f"127.0.0.1:{server.server_address[1]}", 3)
+    threads = [
+        threading.Thread(target=client.get, args=(url(server),)) for _ in range(6)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert server.maxActive == 3
+
+
+def test_shared_client():
+    assert httpClient.sharedClient() is httpClient.sharedClient()
+
+
+def test_rate_limit_pauses_all_requests_to_the_host(server):
+    server.statuses = [429]
+    server.retryAfter = "1"
+    server.delay = 0.05
+    client = httpClient.HttpClient(hostLimit=4)
+    finished = []
+
+    def get():
+        assert client.get(url(server)).status_code == 200
+        finished.append(time.monotonic())
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    threads[0].start()
+    # the others are only sent once the first one got the 429
+    time.sleep(0.2)
+    for t in threads[1:]:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert server.requests == 5
+    assert all(t - start >= 1 for t in finished)
+
+
+def test_rate_limit_too_long_to_wait_for(server):
+    server.statuses = [429]
+    server.retryAfter = str(httpClient.MAX_RETRY_AFTER + 1)
+    client = httpClient.HttpClient()
+
+    assert client.get(url(server)).status_code == 429
+    assert server.requests == 1
@@ -0,0 +1,123 @@
+import io
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from tariochbctools.importers.ibkr import importer as ibkrimp
+
+TEST_CONFIG = b"""
+    token: token
+    queryId: 1
+    baseCcy: USD
+"""
+
+TEST_STATEMENT = b"""<FlexQueryResponse queryName="q" type="AF">
+<FlexStatements count="1">
+<FlexStatement accountId="U1" fromDate="20240101" toDate="20240131"
+ period="LastBusinessDay" whenGenerated="20240131;120000">
+<Trades>
+<Trade symbol="VTz" tradeDate="20240105" quantity="10" currency="USD"
+ tradePrice="100" ibCommission="-1" ibCommissionCurrency="USD" netCash="-1001"
+ fxRateToBase="1" />
+</Trades>
+<CashTransactions>
+<CashTransaction type="Withholding Tax" symbol="VT" currency="USD"
+ amount="-0.38" dateTime="20240115;202000"
+ description="VT(US9220427424) CASH DIVIDEND USD 0.25 PER SHARE - US TAX" />
+<CashTransaction type="Dividends" symbol="VT" currency="USD"
+ amount="2.5" dateTime="20240115;202000"
+ description="VT(US9220427424) CASH DIVIDEND USD 0.25 PER SHARE (Ordinary Dividend)" />
+<CashTransaction type="Dividends" symbol="VT" currency="USD"
+ amount="0.5" dateTime="20240115;202000"
+ description="VT(US9220427424) CASH DIVIDEND USD 0.05 PER SHARE (Bonus Dividend)" />
+<CashTransaction type="Dividends" symbol="VTI" currency="USD"
+ amount="3" dateTime="20240115;202000"
+ description="VTI(US9229087690) CASH DIVIDEND USD 0.30 PER SHARE (Ordinary Dividend)" />
+<CashTransaction type="Withholding Tax" symbol="VTI" currency="USD"
+ amount="-0.45" dateTime="20240115;202000"
+ description="VTI(US9229087690) CASH DIVIDEND USD 0.30 PER SHARE - US TAX" />
+</CashTransactions>
+</FlexStatement>
+</FlexStatements>
+</FlexQueryResponse>"""
+
+
+@pytest.fixture(name="tmp_config")
+def tmp_config_fixture(tmp_path):
+    config = tmp_path / "ibkr.yaml"
+    config.write_bytes(TEST_CONFIG)
+    yield config
+
+
+@pytest.fixture(name="importer")
+def importer_fixture(monkeypatch):
+    importer = ibkrimp.Importer()
+    monkeypatch.setattr(importer, "download", lambda token, queryId: TEST_STATEMENT)
+    monkeypatch.setattr(
+        importer, "openStatement", lambda token, queryId: io.BytesIO(TEST_STATEMENT)
+    )
+    yield importer
+
+
+def test_identify(importer, tmp_config):
+    assert importer.identify(str(tmp_config))
+
+
+def test_extract(importer, tmp_config):
+    entries = importer.extract(str(tmp_config), [])
+
+    assert [e.narration for e in entries] == [
+        "Buy",
+        "Dividend: VT(US9220427424) CASH DIVIDEND USD 0.25 PER SHARE (Ordinary Dividend)",
+        "Dividend: VT(US9220427424) CASH DIVIDEND USD 0.05 PER SHARE (Bonus Dividend)",
+        "Dividend: VTI(US9229087690) CASH DIVIDEND USD 0.30 PER SHARE (Ordinary Dividend)",
+    ]
+    assert entries[0].postings[0].account == "Assets:U1:Investment:IB:VT"
+    assert [[p.units.number for p in e.postings if p.units] for e in entries[1:]] == [
+        [Decimal("2.12"), Decimal("0.38")],
+        [Decimal("0.5")],
+        [Decimal("2.55"), Decimal("0.45")],
+    ]
+
+
+def test_extract_streaming(importer, tmp_config, monkeypatch):
+    entries = importer.extract(str(tmp_config), [])
+    tmp_config.write_bytes(TEST_CONFIG + b"    streaming: true\n")
+    # the statement is read from the file, not downloaded into memory
+    monkeypatch.setattr(importer, "download", None)
+
+    assert importer.extract(str(tmp_config), []) == entries
+
+
+def test_iter_flex_records():
+    records = list(ibkrimp.iterFlexRecords(io.BytesIO(TEST_STATEMENT)))
+
+    assert [(account, container) for account, container, _ in records] == [
+        ("U1", "Trades"),
+        ("U1", "CashTransactions"),
+        ("U1", "CashTransactions"),
+        ("U1", "CashTransactions"),
+        ("U1", "CashTransactions"),
+        ("U1", "CashTransactions"),
+        ("U1", "FlexStatement"),
+    ]
+    assert records[0][2].symbol == "VTz"
+
+
+@pytest.mark.parametrize("streaming", [b"false", b"true"])
+def test_extract_skips_imported_records(importer, tmp_config, streaming):
+    tmp_config.write_bytes(
+        TEST_CONFIG + b"    skipImported: true\n    streaming: " + streaming + b"\n"
+    )
+
+    entries = importer.extract(str(tmp_config), [])
+    assert len(entries) == 4
+    # records of the day of the mark are kept
+    assert importer.extract(str(tmp_config), entries) == entries
+
+    laterTrade = entries[0]._replace(date=date(2024, 2, 1))
+    laterDividend = entries[1]._replace(date=date(2024, 1, 20))
+    # trades and cash transactions have separate marks
+    assert importer.extract(str(tmp_config), [laterTrade]) == entries[1:]
+    assert importer.extract(str(tmp_config), [laterDividend]) == entries[:1]
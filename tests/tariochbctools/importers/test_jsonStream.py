@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from tariochbctools.importers.general import jsonStream
+
+DOCUMENT = {
+    "before": {"booked": [1, 2], "text": "}]\\"},
+    "transactions": {
+        "count": 12345,
+        "booked": [
+            {"id": 1, "text": "grüezi"},
+            {"id": 2, "nested": {"booked": [3]}},
+            [],
+            None,
+            1.25,
+        ],
+        "pending": [{"id": 3}],
+    },
+}
+
+
+def chunked(document, size):
+    content = json.dumps(document, ensure_ascii=False).encode()
+    return [content[i : i + size] for i in range(0, len(content), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10000])
+def test_items_of_path(size):
+    items = jsonStream.iterItems(chunked(DOCUMENT, size), ("transactions", "booked"))
+
+    assert list(items) == DOCUMENT["transactions"]["booked"]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {},
+        {"transactions": {}},
+        {"transactions": None},
+        {"transactions": {"booked": []}},
+    ],
+)
+def test_no_items(document):
+    items = jsonStream.iterItems(chunked(document, 3), ("transactions", "booked"))
+
+    assert list(items) == []
+
+
+def test_items_are_decoded_while_received():
+    chunks = iter(chunked(DOCUMENT, 5))
+
+    items = jsonStream.iterItems(chunks, ("transactions", "booked"))
+
+    assert next(items) == {"id": 1, "text": "grüezi"}
+    assert next(chunks, None) is not None
+
+
+def test_truncated_document():
+    items = jsonStream.iterItems(chunked(DOCUMENT, 5)[:-20], ("transactions", "booked"))
+
+    with pytest.raises(ValueError):
+        list(items)
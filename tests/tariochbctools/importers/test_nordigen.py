@@ -0,0 +1,112 @@
+import json
+import threading
+import time
+
+import pytest
+
+from tariochbctools.importers.general import tokenCache
+from tariochbctools.importers.nordigen import importer as nordimp
+
+TEST_CONFIG = b"""
+    secret_id: id
+    secret_key: key
+    concurrency: 3
+    accounts:
+      - id: slow
+        asset_account: Assets:Slow:CHF
+      - id: fast
+        asset_account: Assets:Fast:CHF
+"""
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.content
+
+    def iter_content(self, chunk_size):
+        content = json.dumps(self.content).encode()
+        # Small chunks to split the transactions between them
+        return (content[i : i + 7] for i in range(0, len(content), 7))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(name="fake_api")
+def fake_api_fixture(monkeypatch):
+    """Serves two accounts, the transactions are only answered once both
+    accounts have been requested, the slow one after the fast one."""
+    requested = []
+    bothRequested = threading.Barrier(2)
+
+    def post(session, url, data):
+        requested.append(url)
+        return FakeResponse({"access": "token", "access_expires": 86400})
+
+    def get(session, url, headers, stream=False):
+        if headers["Authorization"] != "Bearer token":
+            return FakeResponse({"detail": "Invalid token"}, 401)
+        requested.append(url)
+        accountId = url.split("/accounts/")[1].split("/")[0]
+        bothRequested.wait(timeout=5)
+        time.sleep(0.05 if accountId == "slow" else 0)
+        return FakeResponse(
+            {
+                "transactions": {
+                    "booked": [
+                        {
+                            "transactionId": f"{accountId}-{day}",
+                            "bookingDate": f"2024-01-0{day}",
+                            "transactionAmount": {"amount": "1.50", "currency": "CHF"},
+                            "remittanceInformationUnstructured": f"{accountId} ü",
+                        }
+                        for day in (2, 1)
+                    ],
+                    "pending": [{"bookingDate": "2024-01-03"}],
+                }
+            }
+        )
+
+    monkeypatch.setattr(nordimp.requests.Session, "post", post)
+    monkeypatch.setattr(nordimp.requests.Session, "get", get)
+    yield requested
+
+
+def test_extract_accounts_concurrently(tmp_path, fake_api):
+    config = tmp_path / "nordigen.yaml"
+    config.write_bytes(TEST_CONFIG)
+
+    entries = nordimp.Importer().extract(str(config), [])
+
+    assert len([url for url in fake_api if url.endswith("/token/new/")]) == 1
+    assert [(e.postings[0].account, e.meta["nordref"]) for e in entries] == [
+        ("Assets:Slow:CHF", "slow-1"),
+        ("Assets:Slow:CHF", "slow-2"),
+        ("Assets:Fast:CHF", "fast-1"),
+        ("Assets:Fast:CHF", "fast-2"),
+    ]
+
+
+def test_rejected_cached_token_is_renewed(tmp_path, fake_api, monkeypatch):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("TARIOCHBCTOOLS_TOKEN_CACHE", str(tmp_path / "tokens"))
+    tokenCache.cachedToken("nordigen/id", "key", lambda: ("revoked", 86400))
+    config = tmp_path / "nordigen.yaml"
+    config.write_bytes(TEST_CONFIG)
+
+    assert len(nordimp.Importer().extract(str(config), [])) == 4
+    assert len([url for url in fake_api if url.endswith("/token/new/")]) == 1
+    assert tokenCache.cachedToken("nordigen/id", "key", None) == "token"
@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+from beancount.core import amount, data
+from beancount.core.number import D
+
+from tariochbctools.importers.general.priceLookup import (
+    PriceLookup,
+    PriceMapCache,
+    priceMapCache,
+)
+
+
+def _price(day, currency, number, quote="CHF"):
+    return data.Price(
+        data.new_metadata("test", 0),
+        datetime.date(2024, 1, day),
+        currency,
+        amount.Amount(D(number), quote),
+    )
+
+
+@pytest.fixture(name="cache")
+def cache_fixture():
+    return PriceMapCache()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    priceMapCache.invalidate()
+    priceMapCache.hits = priceMapCache.misses = 0
+    yield
+    priceMapCache.invalidate()
+
+
+def test_price_map_is_shared(cache):
+    existing = [_price(1, "USD", "0.9"), _price(2, "EUR", "0.95")]
+
+    priceMap = cache.get(existing)
+    assert cache.get(existing) is priceMap
+    assert cache.info() == (1, 1)
+
+
+def test_price_map_is_reused_when_no_prices_are_added(cache):
+    existing = [_price(1, "USD", "0.9")]
+    priceMap = cache.get(existing)
+
+    existing.append(
+        data.Transaction(
+            data.new_metadata("test", 0),
+            datetime.date(2024, 1, 3),
+            "*",
+            "",
+            "",
+            data.EMPTY_SET,
+            data.EMPTY_SET,
+            [],
+        )
+    )
+    assert cache.get(existing) is priceMap
+    assert cache.get(list(existing)) is priceMap
+    assert cache.info() == (2, 1)
+
+
+def test_price_map_is_rebuilt_when_prices_change(cache):
+    existing = [_price(1, "USD", "0.9")]
+    priceMap = cache.get(existing)
+
+    existing.append(_price(2, "USD", "0.8"))
+    assert cache.get(existing) is not priceMap
+    assert cache.info() == (0, 2)
+
+
+def test_invalidate(cache):
+    existing = [_price(1, "USD", "0.9")]
+    priceMap = cache.get(existing)
+
+    cache.invalidate()
+    assert cache.get(existing) is not priceMap
+    assert cache.info() == (0, 2)
+
+
+def test_lookups_share_the_price_map():
+    existing = [_price(1, "USD", "0.9")]
+    usd = PriceLookup(existing, "CHF")
+    eur = PriceLookup(existing, "EUR")
+
+    assert usd.priceMap is eur.priceMap
+    assert usd.fetchPriceAmount("USD", datetime.date(2024, 1, 5)) == D("0.9")
+    assert priceMapCache.info() == (1, 1)
+
+
+def test_fetch_price_amounts_matches_single_lookups():
+    existing = [
+        _price(2, "USD", "0.9"),
+        _price(5, "USD", "0.8"),
+        _price(3, "EUR", "0.95"),
+        _price(4, "CHF", "1.1", quote="EUR"),
+    ]
+    lookup = PriceLookup(existing, "CHF")
+    queries = [
+        (ccy, datetime.date(2024, 1, day))
+        for day in (6, 1, 2, 4, 5, 3)
+        for ccy in ("USD", "EUR", "CHF", "GBP")
+    ]
+
+    assert lookup.fetchPriceAmounts(queries) == [
+        lookup.fetchPriceAmount(ccy, day) for ccy, day in queries
+    ]
+
+
+def test_prefetch():
+    lookup = PriceLookup([_price(2, "USD", "0.9")], "CHF")
+    lookup.prefetch([("USD", datetime.date(2024, 1, 3))])
+    lookup.priceMap = None
+
+    assert lookup.fetchPriceAmount("USD", datetime.date(2024, 1, 3)) == D("0.9")
@@ -0,0 +1,85 @@
+import datetime
+
+from beancount import loader
+from beancount.core import data, prices
+
+from tariochbctools.importers.general import priceSnapshot
+from tariochbctools.importers.general.priceLookup import PriceMapCache
+
+LEDGER = """
+2024-01-01 price USD 0.9 CHF
+2024-01-03 price USD 0.8712 CHF
+2024-01-02 price EUR 0.95 CHF
+2024-01-02 price CHF 1.05 EUR
+2024-01-05 price BTC 40000.00 USD
+"""
+
+
+def _load(tmp_path, content=LEDGER):
+    ledger = tmp_path / "ledger.beancount"
+    ledger.write_text(content)
+    entries, errors, _ = loader.load_file(str(ledger))
+    assert not errors
+    return [e for e in entries if isinstance(e, data.Price)]
+
+
+def test_snapshot_roundtrip(tmp_path):
+    priceEntries = _load(tmp_path)
+    priceDigest = priceSnapshot.digest(priceEntries)
+    snapshot = str(tmp_path / "prices.snapshot")
+    priceMap = prices.build_price_map(priceEntries)
+
+    priceSnapshot.save(snapshot, priceMap, priceDigest)
+    loaded = priceSnapshot.load(snapshot, priceDigest)
+
+    assert loaded is not None
+    assert sorted(loaded.forward_pairs) == sorted(priceMap.forward_pairs)
+    assert dict(loaded.items()) == dict(priceMap)
+    assert prices.get_price(
+        loaded, ("USD", "CHF"), datetime.date(2024, 1, 2)
+    ) == prices.get_price(priceMap, ("USD", "CHF"), datetime.date(2024, 1, 2))
+
+
+def test_snapshot_is_invalid_when_prices_change(tmp_path):
+    priceEntries = _load(tmp_path)
+    snapshot = str(tmp_path / "prices.snapshot")
+    priceSnapshot.save(
+        snapshot,
+        prices.build_price_map(priceEntries),
+        priceSnapshot.digest(priceEntries),
+    )
+
+    changed = _load(tmp_path, LEDGER.replace("0.8712", "0.8713"))
+    assert priceSnapshot.load(snapshot, priceSnapshot.digest(changed)) is None
+
+
+def test_snapshot_is_invalid_when_generated_prices_change(tmp_path):
+    """Prices generated by a plugin keep the meta of their source price, only
+    their content tells them apart."""
+    priceEntries = _load(tmp_path)
+    snapshot = tmp_path / "prices.snapshot"
+    PriceMapCache(str(snapshot)).get(priceEntries)
+
+    generated = [
+        e._replace(amount=e.amount._replace(currency="EUR"))
+        if e.currency == "USD"
+        else e
+        for e in priceEntries
+    ]
+    priceMap = PriceMapCache(str(snapshot)).get(generated)
+
+    assert not isinstance(priceMap, priceSnapshot.SnapshotPriceMap)
+    assert ("USD", "EUR") in priceMap
+    assert ("USD", "CHF") not in priceMap
+
+
+def test_cache_uses_snapshot(tmp_path):
+    priceEntries = _load(tmp_path)
+    snapshot = tmp_path / "prices.snapshot"
+
+    built = PriceMapCache(str(snapshot)).get(priceEntries)
+    assert snapshot.exists()
+
+    loaded = PriceMapCache(str(snapshot)).get(priceEntries)
+    assert isinstance(loaded, priceSnapshot.SnapshotPriceMap)
+    assert loaded[("EUR", "CHF")] == built[("EUR", "CHF")]
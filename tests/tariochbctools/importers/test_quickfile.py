@@ -1,4 +1,5 @@
 import json
+import uuid
 from unittest.mock import MagicMock, call
 
 import pytest
@@ -149,16 +150,18 @@ def test_extract_transaction_has_quickfile_id(importer, tmp_trx, tmp_metadata):
 
 
 def test_request_header_auth(importer, tmp_config):
-    header = importer.quickfile.request_header()
+    submission_number = uuid.uuid4()
+    header = importer.quickfile.request_header(submission_number)
     auth = header.get("Authentication")
 
     config = importer.config
 
+    assert header["SubmissionNumber"] == str(submission_number)
     assert auth["AccNumber"] == config["account_number"]
     assert auth["MD5Value"] == importer.quickfile.auth_md5(
         config["account_number"],
         config["api_key"],
-        importer.quickfile.submission_number,
+        submission_number,
     )
     assert auth["ApplicationID"] == config["app_id"]
 
@@ -198,3 +201,76 @@ def test_bank_search_with_dates():
         }
     }
     under_test._post.assert_called_with("bank/search", expected_search_parameters)
+
+
+@pytest.fixture(name="fake_api")
+def fake_api_fixture(monkeypatch):
+    """A bank search api with 450 transactions in account 1200 and 3 in 1201"""
+    requested = []
+
+    def post(session, url, **kwargs):
+        requested.append(kwargs["json"]["payload"])
+        search = kwargs["json"]["payload"]["Body"]["SearchParameters"]
+        total = 450 if search["NominalCode"] == "1200" else 3
+        offset = int(search["Offset"])
+        ids = range(offset, min(offset + int(search["ReturnCount"]), total))
+        body = {
+            "MetaData": dict(
+                json.loads(TEST_META_DATA),
+                RecordsetCount=total,
+                ReturnCount=len(ids),
+            ),
+            "Transactions": {
+                "Transaction": [
+                    dict(json.loads(TEST_TRX), TransactionId=i) for i in ids
+                ]
+            },
+        }
+        response = MagicMock()
+        response.json.return_value = {"Bank_Search": {"Body": body}}
+        return response
+
+    monkeypatch.setattr(qfimp.requests.Session, "post", post)
+    yield requested
+
+
+def test_extract_all_pages(importer_factory, tmp_config, fake_api):
+    importer = importer_factory(TEST_CONFIG.replace(b"transaction_count: 200", b""))
+    entries = importer.extract(tmp_config)
+
+    assert [(e.postings[0].account, e.meta["quickfile_id"]) for e in entries] == [
+        ("Assets:Other", str(i)) for i in range(450)
+    ] + [("Assets:Savings", str(i)) for i in range(3)]
+    offsets = sorted(
+        (
+            payload["Body"]["SearchParameters"]["NominalCode"],
+            payload["Body"]["SearchParameters"]["Offset"],
+            payload["Body"]["SearchParameters"]["ReturnCount"],
+        )
+        for payload in fake_api
+    )
+    assert offsets == [
+        ("1200", "0", "200"),
+        ("1200", "200", "200"),
+        ("1200", "400", "50"),
+        ("1201", "0", "200"),
+    ]
+    submission_numbers = {payload["Header"]["SubmissionNumber"] for payload in fake_api}
+    assert len(submission_numbers) == len(fake_api)
+    for payload in fake_api:
+        header = payload["Header"]
+        assert header["Authentication"]["MD5Value"] == qfimp.QuickFile.auth_md5(
+            "YOUR_ACCOUNT_NUMBER", "SOME_API_KEY", header["SubmissionNumber"]
+        )
+
+
+def test_extract_transaction_count(importer_factory, tmp_config, fake_api):
+    importer = importer_factory(
+        TEST_CONFIG.replace(b"transaction_count: 200", b"transaction_count: 250")
+    )
+    entries = importer.extract(tmp_config)
+
+    assert len(entries) == 253
+    assert sorted(
+        payload["Body"]["SearchParameters"]["Offset"] for payload in fake_api
+    ) == ["0", "0", "200"]
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+
+from tariochbctools.importers.general import tokenCache
+
+pytest.importorskip("cryptography")
+
+
+@pytest.fixture(name="fetches")
+def fetches_fixture(tmp_path, monkeypatch):
+    monkeypatch.setenv("TARIOCHBCTOOLS_TOKEN_CACHE", str(tmp_path))
+    fetches = []
+
+    def fetch(expiresIn=3600):
+        fetches.append(expiresIn)
+        return f"token-{len(fetches)}", expiresIn
+
+    yield fetch, fetches
+
+
+def test_token_is_reused(fetches):
+    fetch, fetched = fetches
+
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-1"
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-1"
+    assert tokenCache.cachedToken("api/other", "secret", fetch) == "token-2"
+    assert len(fetched) == 2
+
+
+def test_token_expiring_soon_is_renewed(fetches):
+    fetch, fetched = fetches
+
+    tokenCache.cachedToken("api/id", "secret", lambda: fetch(60))
+
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-2"
+    assert fetched == [60, 3600]
+
+
+def test_token_is_encrypted(fetches, tmp_path):
+    fetch, fetched = fetches
+    tokenCache.cachedToken("api/id", "secret", fetch)
+
+    [tokenFile] = tmp_path.iterdir()
+    assert b"token-1" not in tokenFile.read_bytes()
+    assert tokenFile.stat().st_mode & 0o077 == 0
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-1"
+    assert len(fetched) == 1
+
+
+def test_token_of_other_secret_is_not_used(fetches):
+    fetch, fetched = fetches
+    tokenCache.cachedToken("api/id", "secret", fetch)
+
+    assert tokenCache.cachedToken("api/id", "other secret", fetch) == "token-2"
+    assert len(fetched) == 2
+
+
+def test_tampered_token_is_not_used(fetches, tmp_path):
+    fetch, fetched = fetches
+    tokenCache.cachedToken("api/id", "secret", fetch)
+    [tokenFile] = tmp_path.iterdir()
+    content = bytearray(tokenFile.read_bytes())
+    content[-5] ^= 1
+    tokenFile.write_bytes(bytes(content))
+
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-2"
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-2"
+    assert len(fetched) == 2
+
+
+def test_cache_needs_cryptography(fetches, tmp_path, monkeypatch):
+    fetch, fetched = fetches
+    monkeypatch.setattr(tokenCache, "Fernet", None)
+
+    tokenCache.cachedToken("api/id", "secret", fetch)
+    tokenCache.cachedToken("api/id", "secret", fetch)
+
+    assert list(tmp_path.iterdir()) == []
+    assert len(fetched) == 2
+
+
+def test_invalidated_token_is_renewed(fetches):
+    fetch, fetched = fetches
+    tokenCache.cachedToken("api/id", "secret", fetch)
+    tokenCache.invalidate("api/id")
+
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-2"
+    assert len(fetched) == 2
+
+
+def test_rejected_token_is_renewed_once(fetches):
+    fetch, fetched = fetches
+    token = tokenCache.CachedToken("api/id", "secret", fetch)
+
+    assert token.renew("token-1") == "token-2"
+    # a second request rejected with the old token gets the new one
+    assert token.renew("token-1") == "token-2"
+    assert tokenCache.cachedToken("api/id", "secret", fetch) == "token-2"
+    assert len(fetched) == 2
+
+
+def test_cache_is_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("TARIOCHBCTOOLS_TOKEN_CACHE", raising=False)
+    fetched = []
+
+    def fetch():
+        fetched.append(time.time())
+        return "token", 3600
+
+    tokenCache.cachedToken("api/id", "secret", fetch)
+    tokenCache.cachedToken("api/id", "secret", fetch)
+    assert len(fetched) == 2
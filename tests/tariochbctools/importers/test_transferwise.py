@@ -0,0 +1,174 @@
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import rsa
+
+from tariochbctools.importers.transferwise import importer as twimp
+
+CURRENCIES = ["CHF", "EUR", "GBP", "USD"]
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self.content
+
+
+@pytest.fixture(name="keys", scope="module")
+def keys_fixture():
+    yield rsa.newkeys(512)
+
+
+@pytest.fixture(name="config")
+def config_fixture(tmp_path, keys):
+    privateKey = tmp_path / "wise.pem"
+    privateKey.write_bytes(keys[1].save_pkcs1("PEM"))
+    config = tmp_path / "transferwise.yaml"
+    config.write_text(
+        f'token: TOKEN\nbaseAccount: "Assets:Wise:"\nprivateKeyPath: {privateKey}\n'
+    )
+    yield config
+
+
+@pytest.fixture(name="fake_api")
+def fake_api_fixture(monkeypatch, keys):
+    """An api that requires the statements to be signed, challenges are
+    only solved once all statements have been requested."""
+    challenges = []
+    requested = threading.Barrier(len(CURRENCIES))
+
+    def get(session, url, params=None, headers=None):
+        if url.endswith("/borderless-accounts"):
+            return FakeResponse(
+                [{"id": 7, "balances": [{"currency": ccy} for ccy in CURRENCIES]}]
+            )
+
+        currency = url.split("currency=")[1].split("&")[0]
+        if "x-2fa-approval" not in headers:
+            requested.wait(timeout=5)
+            challenges.append(currency)
+            return FakeResponse(
+                None, 403, {"x-2fa-approval": f"token-{len(challenges)}"}
+            )
+
+        rsa.verify(
+            headers["x-2fa-approval"].encode("ascii"),
+            twimp.base64.b64decode(headers["X-Signature"]),
+            keys[0],
+        )
+        return FakeResponse(
+            {
+                "transactions": [
+                    {
+                        "referenceNumber": f"{currency}-1",
+                        "date": "2024-01-02T10:00:00Z",
+                        "details": {"description": currency},
+                        "amount": {"value": 1.5, "currency": currency},
+                    }
+                ]
+            }
+        )
+
+    monkeypatch.setattr(twimp.httpClient.requests.Session, "get", get)
+    yield challenges
+
+
+def test_extract_statements_concurrently(monkeypatch, config, fake_api):
+    loads = []
+    signs = []
+    load_pkcs1 = rsa.PrivateKey.load_pkcs1
+    sign = rsa.sign
+
+    def counting_load_pkcs1(*args):
+        loads.append(args)
+        return load_pkcs1(*args)
+
+    def counting_sign(*args):
+        signs.append(args)
+        return sign(*args)
+
+    monkeypatch.setattr(rsa.PrivateKey, "load_pkcs1", counting_load_pkcs1)
+    monkeypatch.setattr(rsa, "sign", counting_sign)
+    importer = twimp.Importer(profileId=1)
+
+    entries = importer.extract(str(config), [])
+
+    assert [(e.postings[0].account, e.meta["ref"]) for e in entries] == [
+        (f"Assets:Wise:{ccy}", f"{ccy}-1") for ccy in CURRENCIES
+    ]
+    assert len(fake_api) == len(CURRENCIES)
+    assert len(signs) == 1
+    assert len(loads) == 1
+
+
+@pytest.fixture(name="statement_api")
+def statement_api_fixture(monkeypatch):
+    """An api with a transaction at the start of each statement interval and
+    one that fails to return the statements of failing intervals."""
+    requested = []
+    failing = set()
+
+    def get(session, url, params=None, headers=None):
+        if url.endswith("/borderless-accounts"):
+            return FakeResponse(
+                [{"id": 7, "balances": [{"currency": ccy} for ccy in ["CHF", "EUR"]]}]
+            )
+
+        query = parse_qs(urlsplit(url).query)
+        currency = query["currency"][0]
+        start = query["intervalStart"][0]
+        requested.append((currency, start[:10]))
+        if start[:10] in failing:
+            return FakeResponse(None, 500)
+        return FakeResponse(
+            {
+                "transactions": [
+                    {
+                        "referenceNumber": f"{currency}-{day}",
+                        "date": day,
+                        "details": {"description": currency},
+                        "amount": {"value": 1.5, "currency": currency},
+                    }
+                    for day in ["2020-01-01", start[:10]]
+                ]
+            }
+        )
+
+    monkeypatch.setattr(twimp.httpClient.requests.Session, "get", get)
+    yield requested, failing
+
+
+def test_backfill(tmp_path, statement_api):
+    requested, failing = statement_api
+    config = tmp_path / "transferwise.yaml"
+    config.write_text(
+        "token: TOKEN\n"
+        'baseAccount: "Assets:Wise:"\n'
+        "privateKeyPath: wise.pem\n"
+        "backfill:\n"
+        "  startDate: 2020-01-01\n"
+        "  checkpointDir: checkpoints\n"
+    )
+    importer = twimp.Importer(profileId=1, endDate="2022-01-01T00:00:00+00:00")
+
+    failing.add("2021-04-14")
+    with pytest.raises(Exception, match="Failed to get transactions"):
+        importer.extract(str(config), [])
+    assert len(list((tmp_path / "checkpoints").iterdir())) == 2
+
+    failing.clear()
+    requested.clear()
+    entries = importer.extract(str(config), [])
+
+    assert sorted(requested) == [("CHF", "2021-04-14"), ("EUR", "2021-04-14")]
+    assert [(e.postings[0].account, e.meta["ref"]) for e in entries] == [
+        ("Assets:Wise:CHF", "CHF-2020-01-01"),
+        ("Assets:Wise:CHF", "CHF-2021-04-14"),
+        ("Assets:Wise:EUR", "EUR-2020-01-01"),
+        ("Assets:Wise:EUR", "EUR-2021-04-14"),
+    ]
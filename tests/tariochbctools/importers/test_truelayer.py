@@ -1,4 +1,5 @@
 import json
+import time
 from datetime import timedelta
 
 import dateutil.parser
@@ -6,6 +7,7 @@ import pytest
 import yaml
 from beancount.core.amount import Decimal as D
 
+from tariochbctools.importers.general import tokenCache
 from tariochbctools.importers.truelayer import importer as tlimp
 
 # pylint: disable=protected-access
@@ -238,3 +240,126 @@ def test_accounts_config_is_optional(importer_factory):
 
     importer = importer_factory(TEST_CONFIG_WITHOUT_ACCOUNTS)
     assert importer._get_account_for_account_id("any-account-id-1") == "DefaultAccount"
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    def json(self):
+        return self.content
+
+
+@pytest.fixture(name="fake_api")
+def fake_api_fixture(monkeypatch):
+    """Serves two accounts and one card, answering the later accounts faster."""
+    trx = json.loads(TEST_TRX)
+    balance = json.loads(TEST_BALANCE_SIMPLE)
+    accounts = {
+        "accounts": ["hex-account-id-1", "hex-account-id-2"],
+        "cards": ["hex-account-id-3"],
+    }
+    delays = {"hex-account-id-1": 0.05, "hex-account-id-2": 0.02}
+    requested = []
+    tokens = []
+
+    def post(session, url, data):
+        tokens.append(f"token-{len(tokens) + 1}")
+        return FakeResponse({"access_token": tokens[-1], "expires_in": 3600})
+
+    def get(session, url, **kwargs):
+        if not tokens or kwargs["headers"]["Authorization"] != "Bearer " + tokens[-1]:
+            return FakeResponse({"error": "invalid_token"}, 401)
+        requested.append((url, kwargs.get("params")))
+        path = url.split("/data/v1/")[1].split("/")
+        if len(path) == 1:
+            return FakeResponse(
+                {"results": [{"account_id": a} for a in accounts[path[0]]]}
+            )
+        time.sleep(delays.get(path[1], 0))
+        if path[2] == "balance":
+            return FakeResponse({"results": [balance]})
+        return FakeResponse(
+            {
+                "results": [
+                    dict(
+                        trx,
+                        description=f"{path[1]} {i}",
+                        transaction_id=f"{path[1]}-{i}",
+                        timestamp=f"2021-06-1{4 + i}T00:00:00Z",
+                    )
+                    for i in range(2)
+                ]
+            }
+        )
+
+    monkeypatch.setattr(tlimp.requests.Session, "post", post)
+    monkeypatch.setattr(tlimp.requests.Session, "get", get)
+    yield requested
+
+
+def test_extract_concurrently_keeps_order(importer_factory, tmp_path, fake_api):
+    importer = importer_factory(TEST_CONFIG + b"    concurrency: 3\n")
+    entries = importer.extract(str(tmp_path / "truelayer.yaml"), [])
+
+    assert len(fake_api) == 2 + 3 * 2
+    assert [
+        (type(e).__name__, e.narration if hasattr(e, "narration") else e.account)
+        for e in entries
+    ] == [
+        ("Balance", "Assets:Other"),
+        ("Transaction", "hex-account-id-1 0"),
+        ("Transaction", "hex-account-id-1 1"),
+        ("Balance", "Assets:Savings"),
+        ("Transaction", "hex-account-id-2 0"),
+        ("Transaction", "hex-account-id-2 1"),
+        ("Balance", "Liabilities:Mastercard"),
+        ("Transaction", "hex-account-id-3 0"),
+        ("Transaction", "hex-account-id-3 1"),
+    ]
+    assert entries[-1].postings[0].units.number == -D(
+        str(json.loads(TEST_TRX)["amount"])
+    )
+
+
+def test_rejected_cached_token_is_renewed(
+    importer_factory, tmp_path, fake_api, monkeypatch
+):
+    pytest.importorskip("cryptography")
+    monkeypatch.setenv("TARIOCHBCTOOLS_TOKEN_CACHE", str(tmp_path / "tokens"))
+    importer = importer_factory(TEST_CONFIG)
+    name = f"truelayer/{importer.domain}/{importer.clientId}/{importer.refreshToken}"
+    tokenCache.cachedToken(name, importer.clientSecret, lambda: ("revoked", 86400))
+
+    assert len(importer.extract(str(tmp_path / "truelayer.yaml"), [])) == 9
+    assert tokenCache.cachedToken(name, importer.clientSecret, None) == "token-1"
+
+
+def test_extract_from_sync_cursor(importer_factory, tmp_path, fake_api):
+    importer = importer_factory(TEST_CONFIG + b"    incremental_sync: true\n")
+    config = str(tmp_path / "truelayer.yaml")
+
+    entries = importer.extract(config, [])
+    assert len(entries) == 9
+    assert all(params is None for _, params in fake_api)
+
+    fake_api.clear()
+    imported = [
+        e
+        for e in entries
+        if e.meta.get("transaction_id", "").startswith("hex-account-id-1")
+    ]
+    importer.extract(config, imported)
+
+    params = {
+        url.split("/")[-2]: params
+        for url, params in fake_api
+        if url.endswith("/transactions")
+    }
+    assert params["hex-account-id-1"]["from"] == "2021-06-12T00:00:00+00:00"
+    assert params["hex-account-id-2"] is None
+    assert params["hex-account-id-3"] is None
@@ -0,0 +1,102 @@
+import pytest
+from beancount import loader
+
+from tariochbctools.plugins import check_portfolio_sum
+
+LEDGER = """
+2020-01-01 open Assets:Peter:Bank
+2020-01-01 open Assets:Anna:Bank
+2020-01-01 open Expenses:Peter:Food
+2020-01-01 open Expenses:Anna:Food
+2020-01-01 open Assets:Peter:Stock
+
+2020-01-02 * "balanced"
+  Assets:Peter:Bank  -10 CHF
+  Expenses:Peter:Food  10 CHF
+
+2020-01-03 * "cross portfolio"
+  Assets:Peter:Bank  -10 CHF
+  Expenses:Anna:Food  10 CHF
+
+2020-01-04 * "different weights"
+  Assets:Peter:Bank  -10 CHF
+  Expenses:Peter:Food  10 CHF
+  Assets:Anna:Bank  -20 CHF
+  Expenses:Anna:Food  20 CHF
+
+2020-01-05 * "skipped"
+  skip_cross_portfolio_check: TRUE
+  Assets:Peter:Bank  -10 CHF
+  Expenses:Peter:Food  10 CHF
+  Assets:Anna:Bank  -20 CHF
+  Expenses:Anna:Food  20 CHF
+
+2020-01-06 * "explicit weight"
+  Assets:Peter:Stock  1 STOCK {10 CHF}
+    portfolio_check_weight: 12
+  Assets:Peter:Bank  -10 CHF
+"""
+
+
+def _errors(config=None):
+    entries, errors, _ = loader.load_string(LEDGER)
+    assert not errors
+    _, errors = check_portfolio_sum.check(entries, {}, config)
+    return [(type(e).__name__, e.entry.narration, e.message) for e in errors]
+
+
+def test_check():
+    assert _errors() == [
+        (
+            "NonZeroWeightPerPortfolio",
+            "cross portfolio",
+            "Weights for portfolio Anna don't equal zero 10.00 != 0",
+        ),
+        (
+            "NonZeroWeightPerPortfolio",
+            "cross portfolio",
+            "Weights for portfolio Peter don't equal zero 0 != -10.00",
+        ),
+        (
+            "DifferentWeightPerPortfolio",
+            "cross portfolio",
+            "Not all portfolios have the same weight",
+        ),
+        (
+            "DifferentWeightPerPortfolio",
+            "different weights",
+            "Not all portfolios have the same weight",
+        ),
+        (
+            "NonZeroWeightPerPortfolio",
+            "explicit weight",
+            "Weights for portfolio Peter don't equal zero 12 != -10.00",
+        ),
+    ]
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_parallel_check_matches_serial(workers):
+    assert _errors(f"{{'workers': {workers}}}") == _errors()
+
+
+def test_fast_path_matches_decimal():
+    entries, errors, _ = loader.load_string(
+        LEDGER
+        + """
+2020-01-07 * "sub-cent weight"
+  Assets:Peter:Stock  1 STOCK {10 CHF}
+    portfolio_check_weight: 10.004
+  Assets:Peter:Bank  -10 CHF
+
+2020-01-08 * "sub-cent amounts"
+  Assets:Peter:Bank  -10.004 CHF
+  Expenses:Peter:Food  10.004 CHF
+"""
+    )
+    assert not errors
+    for entry in entries:
+        if hasattr(entry, "postings"):
+            assert check_portfolio_sum._checkTransaction(
+                entry
+            ) == check_portfolio_sum._checkTransactionDecimal(entry)
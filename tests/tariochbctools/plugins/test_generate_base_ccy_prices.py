@@ -5,9 +5,19 @@ import pytest
 from beancount import loader
 from beancount.parser import printer
 
+from tariochbctools.plugins import generate_base_ccy_prices
+
 
 @pytest.mark.parametrize(
-    "testCase", ["normal", "missing_fx", "entry_already_exists", "issue122"]
+    "testCase",
+    [
+        "normal",
+        "missing_fx",
+        "entry_already_exists",
+        "issue122",
+        "incremental",
+        "duplicates",
+    ],
 )
 def test_data(testCase):
     dataDir = os.path.join(
@@ -32,3 +42,35 @@ def test_data(testCase):
     else:
         with open(expectedPath, "w") as expectedFile:
             expectedFile.write(actual)
+
+
+def test_incremental_cache(tmp_path, monkeypatch):
+    ledger = tmp_path / "ledger.beancount"
+    ledger.write_text(
+        """plugin "tariochbctools.plugins.generate_base_ccy_prices" "{'baseCcy': 'CHF', 'incremental': True, 'cache': 'prices.json'}"
+2020-01-01 price USD 1.2 CHF
+2020-01-01 price EUR 1.1 CHF
+2020-01-02 price FOO 1 USD
+2020-01-02 price BAR 2 EUR
+"""
+    )
+    entries, errors, _ = loader.load_file(str(ledger))
+    assert not errors
+    assert (tmp_path / "prices.json").exists()
+
+    generatePair = generate_base_ccy_prices._generatePair
+    recomputed = []
+
+    def trackingGeneratePair(pairEntries, *args):
+        recomputed.append(pairEntries[0].currency)
+        return generatePair(pairEntries, *args)
+
+    monkeypatch.setattr(generate_base_ccy_prices, "_generatePair", trackingGeneratePair)
+    generate_base_ccy_prices._memoryCache.clear()
+    with open(ledger, "a") as f:
+        f.write("2020-01-03 price EUR 1.05 CHF\n")
+    updated, errors, _ = loader.load_file(str(ledger))
+    assert not errors
+
+    assert recomputed == ["BAR"]
+    assert len(updated) == len(entries) + 1
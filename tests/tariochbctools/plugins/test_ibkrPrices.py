@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import pytest
+
+from tariochbctools.plugins.prices import ibkr
+
+STATEMENT = b"""<FlexQueryResponse queryName="q" type="AF">
+<FlexStatements count="1">
+<FlexStatement accountId="U1" fromDate="20240101" toDate="20240131"
+ period="LastBusinessDay" whenGenerated="20240131;120000">
+<OpenPositions>
+<OpenPosition symbol="VWRLz" markPrice="100.5" reportDate="20240131" currency="CHF" />
+<OpenPosition symbol="BRK.B" markPrice="400" reportDate="20240131" currency="USD" />
+</OpenPositions>
+</FlexStatement>
+</FlexStatements>
+</FlexQueryResponse>"""
+
+
+@pytest.fixture
+def parses(monkeypatch):
+    monkeypatch.setenv("IBKR_TOKEN", "token")
+    monkeypatch.setenv("IBKR_QUERY_ID", "1")
+    monkeypatch.setattr(ibkr.flexCache, "download", lambda token, queryId: STATEMENT)
+    calls = []
+    parse = ibkr.parser.parse
+
+    def countingParse(response):
+        calls.append(response)
+        return parse(response)
+
+    monkeypatch.setattr(ibkr.parser, "parse", countingParse)
+    monkeypatch.setattr(ibkr, "_symbolIndex", ("", {}))
+    return calls
+
+
+def test_get_latest_price(parses):
+    vwrl = ibkr.Source().get_latest_price("VWRL")
+    brk = ibkr.Source().get_latest_price("BRK")
+
+    assert vwrl.price == Decimal("100.5")
+    assert vwrl.quote_currency == "CHF"
+    assert vwrl.time.date().isoformat() == "2024-01-31"
+    assert brk.price == Decimal("400")
+    assert brk.quote_currency == "USD"
+    assert ibkr.Source().get_latest_price("UNKNOWN") is None
+    assert len(parses) == 1